@@ -39,6 +39,7 @@
 - 支持单节点和副本集两种 MongoDB 部署模式
 - 连接失败时会抛出异常，需要确保数据库服务正常运行
 - 所有操作都使用统一的连接，确保连接池的高效利用
+- 异步路由请使用 async_ 开头的方法，避免同步查询阻塞事件循环
 """
 
 import pymongo
@@ -190,6 +191,8 @@ class DatabaseHandler:
                 - MONGO_AUTH_DB: 认证数据库名称
                 - MONGO_TYPE: 连接类型（'single' 或 'replica_set'）
                 - MONGO_REPLICA_SET: 副本集名称（如果使用副本集）
+                - MONGO_MAX_POOL_SIZE / MONGO_MIN_POOL_SIZE / MONGO_MAX_IDLE_TIME_MS:
+                  连接池配置（可选，默认 200 / 10 / 300000）
 
         Raises:
             Exception: 如果数据库连接失败，会抛出异常
@@ -209,33 +212,35 @@ class DatabaseHandler:
             # 格式：mongodb://用户名:密码@地址/认证数据库
             MONGO_URI = f'mongodb://{config["MONGO_USER"]}:{encoded_password}@{config["MONGO_URI"]}/{config["MONGO_AUTH_DB"]}'
             
+            # 同步和异步客户端共用的连接参数
+            client_options = dict(
+                readPreference='secondaryPreferred',  # 优先从从节点读取，分担主节点压力
+                w='majority',  # 写关注级别：确保写入被大多数节点确认，保证数据一致性
+                retryWrites=True,  # 自动重试写操作，提高可靠性
+                socketTimeoutMS=30000,  # Socket 超时时间：30秒
+                connectTimeoutMS=20000,  # 连接超时时间：20秒
+                serverSelectionTimeoutMS=30000,  # 服务器选择超时时间：30秒
+                authSource=config["MONGO_AUTH_DB"],  # 明确指定认证数据库
+                # 连接池配置：图表页面会并发发起大量查询，保留常驻连接避免每次重新握手
+                maxPoolSize=config.get("MONGO_MAX_POOL_SIZE", 200),  # 最大连接数
+                minPoolSize=config.get("MONGO_MIN_POOL_SIZE", 10),  # 常驻最小连接数
+                maxIdleTimeMS=config.get("MONGO_MAX_IDLE_TIME_MS", 300000),  # 空闲连接回收时间：5分钟
+            )
+
             # 根据配置的连接类型创建不同的连接
             if (config['MONGO_TYPE'] == 'single'):
                 # 单节点模式：直接连接到单个 MongoDB 服务器
-                self.mongo_client = pymongo.MongoClient(
-                    MONGO_URI,
-                    readPreference='secondaryPreferred',  # 优先从从节点读取，提高读取性能
-                    w='majority',  # 写关注级别：确保写入被大多数节点确认
-                    retryWrites=True,  # 自动重试写操作，提高可靠性
-                    socketTimeoutMS=30000,  # Socket 超时时间：30秒
-                    connectTimeoutMS=20000,  # 连接超时时间：20秒
-                    serverSelectionTimeoutMS=30000,  # 服务器选择超时时间：30秒
-                    authSource=config["MONGO_AUTH_DB"],  # 明确指定认证数据库
-                )
+                self.mongo_client = pymongo.MongoClient(MONGO_URI, **client_options)
             elif (config['MONGO_TYPE'] == 'replica_set'):
                 # 副本集模式：连接到 MongoDB 副本集
                 # 在连接字符串中添加副本集名称
                 MONGO_URI += f'?replicaSet={config["MONGO_REPLICA_SET"]}'
-                self.mongo_client = pymongo.MongoClient(
-                    MONGO_URI,
-                    readPreference='secondaryPreferred',  # 优先从从节点读取，分担主节点压力
-                    w='majority',  # 写关注级别：确保写入被大多数节点确认，保证数据一致性
-                    retryWrites=True,  # 自动重试写操作，提高可靠性
-                    socketTimeoutMS=30000,  # Socket 超时时间：30秒
-                    connectTimeoutMS=20000,  # 连接超时时间：20秒
-                    serverSelectionTimeoutMS=30000,  # 服务器选择超时时间：30秒
-                    authSource=config["MONGO_AUTH_DB"],  # 明确指定认证数据库
-                )
+                self.mongo_client = pymongo.MongoClient(MONGO_URI, **client_options)
+
+            # 保存连接信息，异步客户端在第一次使用时按相同参数创建
+            self._mongo_uri = MONGO_URI
+            self._client_options = client_options
+            self._async_mongo_client = None
 
             # 打印连接信息（隐藏密码，保护安全）
             # 将连接字符串中的密码替换为 "****"，避免在日志中暴露密码
@@ -509,6 +514,68 @@ class DatabaseHandler:
         """
         return self.mongo_client[db_name][collection_name]
 
+    @property
+    def async_mongo_client(self):
+        """获取异步 MongoDB 客户端（懒加载）
+
+        FastAPI 的 async 路由如果直接调用同步的 PyMongo，会在等待数据库返回时阻塞事件循环，
+        同一个 worker 上的其他请求都要排队。异步客户端在等待网络 I/O 时会让出事件循环，
+        让多个查询可以并发进行。
+
+        客户端使用 PyMongo 自带的原生异步 API（pymongo.AsyncMongoClient），
+        连接参数与同步客户端一致。由于异步客户端会绑定到第一次使用它的事件循环，
+        这里在第一次访问时才创建，而不是在 __init__ 中创建。
+
+        Returns:
+            AsyncMongoClient: 异步 MongoDB 客户端
+        """
+        if self._async_mongo_client is None:
+            self._async_mongo_client = pymongo.AsyncMongoClient(self._mongo_uri, **self._client_options)
+        return self._async_mongo_client
+
+    def get_async_mongo_collection(self, db_name, collection_name):
+        """获取异步 MongoDB 集合对象
+
+        与 get_mongo_collection 相同，但返回的集合对象上的操作都需要 await。
+
+        Args:
+            db_name: 数据库名称，如 "panda"
+            collection_name: 集合名称，如 "factor_analysis_results"
+
+        Returns:
+            AsyncCollection: 异步集合对象
+        """
+        return self.async_mongo_client[db_name][collection_name]
+
+    async def async_mongo_find_one(self, db_name, collection_name, query, projection=None, hint=None):
+        """从 MongoDB 集合中异步查询单个文档
+
+        这是 mongo_find_one 的异步版本，供 async 路由使用，查询期间不会阻塞事件循环。
+
+        Args:
+            db_name: 数据库名称，如 "panda"
+            collection_name: 集合名称，如 "factor_analysis_results"
+            query: 查询条件字典，如 {"task_id": "task_456"}
+            projection: 字段投影字典，指定返回哪些字段，如 {"ic_decay_chart": 1}
+            hint: 索引提示，指定使用哪个索引，如 [("task_id", 1)]
+
+        Returns:
+            Optional[Dict]: 找到的文档字典，如果没找到返回 None
+
+        Example:
+            >>> doc = await db_handler.async_mongo_find_one(
+            ...     "panda",
+            ...     "factor_analysis_results",
+            ...     {"task_id": "task_456"},
+            ...     projection={"ic_decay_chart": 1, "_id": 0}
+            ... )
+        """
+        collection = self.get_async_mongo_collection(db_name, collection_name)
+        # 如果指定了索引提示，使用指定的索引
+        if hint:
+            return await collection.find_one(query, projection, hint=hint)
+        return await collection.find_one(query, projection)
+
     # def mysql_query(self, query, params=None):
     #     cursor = self.mysql_conn.cursor()
     #     cursor.execute(query, params)
@@ -582,7 +649,7 @@ class DatabaseHandler:
         collection = self.get_mongo_collection(db_name, collection_name)
         return collection.insert_many(documents).inserted_ids
 
-    def mongo_aggregate(self, db_name, collection_name, aggregation_pipeline):
+    def mongo_aggregate(self, db_name, collection_name, aggregation_pipeline, batch_size=None, hint=None):
         """在 MongoDB 集合上执行聚合操作
 
         这个函数就像一个"数据分析师"，它可以对数据库中的数据进行复杂的聚合分析，
@@ -615,6 +682,9 @@ class DatabaseHandler:
             db_name: 数据库名称，如 "panda"
             collection_name: 集合名称，如 "stock_market"
             aggregation_pipeline: 聚合管道列表，每个元素是一个聚合操作字典
+            batch_size: 游标每批从服务器取回的文档数（可选），
+                与管道中的 $limit 配合使用时可以一批取完，减少往返次数
+            hint: 强制使用的索引（可选），可以是索引名或索引键列表；索引必须已存在
 
         Returns:
             List[Dict]: 聚合操作的结果列表
@@ -629,7 +699,14 @@ class DatabaseHandler:
             >>> results = db_handler.mongo_aggregate("panda", "stock_market", pipeline)
         """
         collection = self.get_mongo_collection(db_name, collection_name)
-        return list(collection.aggregate(aggregation_pipeline)) 
+        kwargs = {}
+        # 如果指定了批大小，设置游标每批取回的文档数
+        if batch_size:
+            kwargs["batchSize"] = batch_size
+        # 如果指定了索引，跳过查询计划器的索引选择
+        if hint:
+            kwargs["hint"] = hint
+        return list(collection.aggregate(aggregation_pipeline, **kwargs))
     
     def get_distinct_values(self, db_name, collection_name, field):
         """获取集合中某个字段的所有不重复值
@@ -669,7 +746,7 @@ class DatabaseHandler:
         collection = self.get_mongo_collection(db_name, collection_name)
         return collection.distinct(field)
 
-    def mongo_find_one(self, db_name, collection_name, query, hint=None):
+    def mongo_find_one(self, db_name, collection_name, query, projection=None, hint=None):
         """从 MongoDB 集合中查询单个文档
 
         这个函数就像一个"精确查找器"，它会根据查询条件查找第一个匹配的文档。
@@ -685,13 +762,15 @@ class DatabaseHandler:
 
         1. 获取指定的集合对象
         2. 使用查询条件查找第一个匹配的文档
-        3. 如果指定了索引提示，使用指定的索引
-        4. 返回找到的文档，如果没找到返回 None
+        3. 如果指定了投影，只返回需要的字段（减少网络传输和解码开销）
+        4. 如果指定了索引提示，使用指定的索引
+        5. 返回找到的文档，如果没找到返回 None
 
         Args:
             db_name: 数据库名称，如 "panda"
             collection_name: 集合名称，如 "user_factors"
             query: 查询条件字典，如 {"_id": ObjectId("...")}
+            projection: 字段投影字典，指定返回哪些字段，如 {"status": 1}
             hint: 索引提示，指定使用哪个索引，如 [("user_id", 1)]
 
         Returns:
@@ -710,8 +789,8 @@ class DatabaseHandler:
         collection = self.get_mongo_collection(db_name, collection_name)
         # 如果指定了索引提示，使用指定的索引
         if hint:
-            return collection.find_one(query, hint=hint)
-        return collection.find_one(query)
+            return collection.find_one(query, projection, hint=hint)
+        return collection.find_one(query, projection)
 
     def find_documents(self,
                        db_name: str,
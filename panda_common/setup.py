@@ -16,7 +16,7 @@ setup(
     install_requires=[
         "loguru>=0.6.0",
         "PyYAML>=6.0",
-        "pymongo",
+        "pymongo>=4.13",
         "redis"
     ],
     python_requires=">=3.9",
@@ -1,6 +1,8 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from panda_factor_server.routes import user_factor_pro
+from panda_factor_server.services.user_factor_service import ensure_indexes
 from panda_llm.routes import chat_router
 import mimetypes
 from pathlib import Path
@@ -9,7 +11,8 @@ from starlette.staticfiles import StaticFiles
 app = FastAPI(
     title="Panda Server",
     description="Server for Panda AI Factor System",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse  # 使用 orjson 序列化响应，图表数据体积大，比标准库 json 快很多
 )
 
 # Configure CORS
@@ -35,6 +38,11 @@ mimetypes.add_type("application/javascript", ".js")
 # Mount the Vue dist directory at /factor path
 app.mount("/factor", StaticFiles(directory=frontend_folder, html=True), name="static")
 
+@app.on_event("startup")
+def create_indexes():
+    # 启动时确保高频查询依赖的索引存在
+    ensure_indexes()
+
 @app.get("/")
 async def home():
     return {"message": "Welcome to the Panda Server!"}
@@ -1,7 +1,12 @@
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field, field_validator
 from datetime import date
 from typing import Optional, Text
 from panda_factor_server.models.common import Params
+import re
+
+# YYYY-MM-DD 格式的日期字符串，先用正则快速排除格式不对的输入
+_DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
 class CreateFactorRequest(BaseModel):
     """
     创建因子请求参数
@@ -21,11 +26,15 @@ class CreateFactorRequest(BaseModel):
     params: Optional[Params] = Field(default=None, description="参数")
 
     # 添加验证器，将日期字符串转换为 ISO 格式
-    @validator('factor_start_day')
+    @field_validator('factor_start_day')
+    @classmethod
     def validate_factor_start_day(cls, v):
-        if v is not None:
-            try:
-                return date.fromisoformat(v).isoformat()
-            except ValueError:
-                raise ValueError('Invalid date format. Use YYYY-MM-DD')
-        return v
\ No newline at end of file
+        if v is None:
+            return v
+        if not _DATE_RE.match(v):
+            raise ValueError('Invalid date format. Use YYYY-MM-DD')
+        try:
+            # 格式正确但日期不存在（如 2023-02-30）时仍然会失败
+            return date.fromisoformat(v).isoformat()
+        except ValueError:
+            raise ValueError('Invalid date format. Use YYYY-MM-DD')
\ No newline at end of file
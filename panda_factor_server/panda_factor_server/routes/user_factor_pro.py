@@ -41,6 +41,7 @@
 - 错误处理由服务层统一处理，路由层只负责转发
 """
 
+from typing import List, Optional
 from fastapi import APIRouter, Query
 from panda_factor_server.services.user_factor_service import *
 
@@ -280,7 +281,26 @@ async def query_task_status_route(task_id: str):
     Example:
         >>> GET /query_task_status?task_id=task_456
     """
-    return query_task_status(task_id)
+    return await query_task_status(task_id)
+
+@router.get("/wait_task_status")
+async def wait_task_status_route(task_id: str, last_process_status: Optional[int] = None):
+    """长轮询查询任务状态
+
+    这个接口与 query_task_status 返回相同的数据，但当任务状态与 last_process_status 相同时
+    会等待状态变化（最长约 25 秒）再返回，前端可以用它代替每秒一次的轮询。
+
+    Args:
+        task_id: 任务ID
+        last_process_status: 前端当前已知的处理状态，为空时立即返回
+
+    Returns:
+        dict: 任务状态信息，格式与 query_task_status 相同
+
+    Example:
+        >>> GET /wait_task_status?task_id=task_456&last_process_status=3
+    """
+    return await wait_task_status(task_id, last_process_status)
 
 @router.get("/query_factor_excess_chart")
 async def query_factor_excess_chart_route(task_id: str):
@@ -297,7 +317,7 @@ async def query_factor_excess_chart_route(task_id: str):
     Example:
         >>> GET /query_factor_excess_chart?task_id=task_456
     """
-    return query_factor_excess_chart(task_id)
+    return await query_factor_excess_chart(task_id)
 
 @router.get("/query_factor_analysis_data")
 async def query_factor_analysis_data_route(task_id: str):
@@ -314,7 +334,7 @@ async def query_factor_analysis_data_route(task_id: str):
     Example:
         >>> GET /query_factor_analysis_data?task_id=task_456
     """
-    return query_factor_analysis_data(task_id)
+    return await query_factor_analysis_data(task_id)
 
 @router.get("/query_group_return_analysis")
 async def query_group_return_analysis_route(task_id: str):
@@ -331,7 +351,7 @@ async def query_group_return_analysis_route(task_id: str):
     Example:
         >>> GET /query_group_return_analysis?task_id=task_456
     """
-    return query_group_return_analysis(task_id)
+    return await query_group_return_analysis(task_id)
 
 @router.get("/query_ic_decay_chart")
 async def query_ic_decay_chart_route(task_id: str):
@@ -348,7 +368,7 @@ async def query_ic_decay_chart_route(task_id: str):
     Example:
         >>> GET /query_ic_decay_chart?task_id=task_456
     """
-    return query_ic_decay_chart(task_id)
+    return await query_ic_decay_chart(task_id)
 
 @router.get("/query_ic_density_chart")
 async def query_ic_density_chart_route(task_id: str):
@@ -365,7 +385,7 @@ async def query_ic_density_chart_route(task_id: str):
     Example:
         >>> GET /query_ic_density_chart?task_id=task_456
     """
-    return query_ic_density_chart(task_id)
+    return await query_ic_density_chart(task_id)
 
 @router.get("/query_ic_self_correlation_chart")
 async def query_ic_self_correlation_chart_route(task_id: str):
@@ -382,7 +402,7 @@ async def query_ic_self_correlation_chart_route(task_id: str):
     Example:
         >>> GET /query_ic_self_correlation_chart?task_id=task_456
     """
-    return query_ic_self_correlation_chart(task_id)
+    return await query_ic_self_correlation_chart(task_id)
 
 @router.get("/query_ic_sequence_chart")
 async def query_ic_sequence_chart_route(task_id: str):
@@ -399,7 +419,7 @@ async def query_ic_sequence_chart_route(task_id: str):
     Example:
         >>> GET /query_ic_sequence_chart?task_id=task_456
     """
-    return query_ic_sequence_chart(task_id)
+    return await query_ic_sequence_chart(task_id)
 
 @router.get("/query_last_date_top_factor")
 async def query_last_date_top_factor_route(task_id: str):
@@ -416,7 +436,7 @@ async def query_last_date_top_factor_route(task_id: str):
     Example:
         >>> GET /query_last_date_top_factor?task_id=task_456
     """
-    return query_last_date_top_factor(task_id)
+    return await query_last_date_top_factor(task_id)
 
 @router.get("/query_one_group_data")
 async def query_one_group_data_route(task_id: str):
@@ -433,7 +453,7 @@ async def query_one_group_data_route(task_id: str):
     Example:
         >>> GET /query_one_group_data?task_id=task_456
     """
-    return query_one_group_data(task_id)
+    return await query_one_group_data(task_id)
 
 @router.get("/query_rank_ic_decay_chart")
 async def query_rank_ic_decay_chart_route(task_id: str):
@@ -450,7 +470,7 @@ async def query_rank_ic_decay_chart_route(task_id: str):
     Example:
         >>> GET /query_rank_ic_decay_chart?task_id=task_456
     """
-    return query_rank_ic_decay_chart(task_id)
+    return await query_rank_ic_decay_chart(task_id)
 
 @router.get("/query_rank_ic_density_chart")
 async def query_rank_ic_density_chart_route(task_id: str):
@@ -467,7 +487,7 @@ async def query_rank_ic_density_chart_route(task_id: str):
     Example:
         >>> GET /query_rank_ic_density_chart?task_id=task_456
     """
-    return query_rank_ic_density_chart(task_id)
+    return await query_rank_ic_density_chart(task_id)
 
 @router.get("/query_rank_ic_self_correlation_chart")
 async def query_rank_ic_self_correlation_chart_route(task_id: str):
@@ -484,7 +504,7 @@ async def query_rank_ic_self_correlation_chart_route(task_id: str):
     Example:
         >>> GET /query_rank_ic_self_correlation_chart?task_id=task_456
     """
-    return query_rank_ic_self_correlation_chart(task_id)
+    return await query_rank_ic_self_correlation_chart(task_id)
 
 @router.get("/query_rank_ic_sequence_chart")
 async def query_rank_ic_sequence_chart_route(task_id: str):
@@ -501,7 +521,7 @@ async def query_rank_ic_sequence_chart_route(task_id: str):
     Example:
         >>> GET /query_rank_ic_sequence_chart?task_id=task_456
     """
-    return query_rank_ic_sequence_chart(task_id)
+    return await query_rank_ic_sequence_chart(task_id)
 
 @router.get("/query_return_chart")
 async def query_return_chart_route(task_id: str):
@@ -518,7 +538,7 @@ async def query_return_chart_route(task_id: str):
     Example:
         >>> GET /query_return_chart?task_id=task_456
     """
-    return query_return_chart(task_id)
+    return await query_return_chart(task_id)
 
 @router.get("/query_simple_return_chart")
 async def query_simple_return_chart_route(task_id: str):
@@ -535,7 +555,29 @@ async def query_simple_return_chart_route(task_id: str):
     Example:
         >>> GET /query_simple_return_chart?task_id=task_456
     """
-    return query_simple_return_chart(task_id)
+    return await query_simple_return_chart(task_id)
+
+@router.get("/query_all_charts")
+async def query_all_charts_route(
+    task_id: str,
+    fields: Optional[List[str]] = Query(default=None, description="需要的图表字段，可重复传入；不传时返回全部图表")
+):
+    """批量查询图表数据
+
+    这个接口用于在一次请求中获取多个分析图表的数据，
+    替代前端逐个调用各个 query_*_chart 接口。
+
+    Args:
+        task_id: 任务ID
+        fields: 图表字段列表，如 ic_decay_chart、return_chart 等
+
+    Returns:
+        dict: 以字段名为键的图表数据字典
+
+    Example:
+        >>> GET /query_all_charts?task_id=task_456&fields=ic_decay_chart&fields=return_chart
+    """
+    return await query_all_charts(task_id, fields)
 
 @router.get("/task_logs")
 async def get_task_logs_route(task_id: str, last_log_id: str = None):
@@ -7,8 +7,9 @@ from datetime import datetime
 import pytz
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse
 from panda_factor_server.routes import user_factor_pro
+from panda_factor_server.services.user_factor_service import ensure_indexes
 from panda_factor_server.models.result_data import ResultData
 
 # 设置时区
@@ -29,7 +30,8 @@ logger = logging.getLogger('panda')
 app = FastAPI(
     title="Panda Factor API",
     description="Panda Factor API for factor analysis",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse  # 使用 orjson 序列化响应，图表数据体积大，比标准库 json 快很多
 )
 
 # Configure CORS
@@ -45,6 +47,11 @@ app.add_middleware(
 # app.include_router(user_factor.router, prefix="/api/v1", tags=["user_factors"])
 app.include_router(user_factor_pro.router, prefix="/api/v1", tags=["user_factors"])
 
+@app.on_event("startup")
+def create_indexes():
+    # 启动时确保高频查询依赖的索引存在
+    ensure_indexes()
+
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
     start_time = datetime.now(pytz.timezone('Asia/Shanghai'))
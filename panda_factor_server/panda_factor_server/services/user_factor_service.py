@@ -35,19 +35,28 @@
 注意事项
 --------
 
-- 所有函数都是同步函数，由路由层的异步函数调用
+- 大部分函数是同步函数，由路由层的异步函数调用
+- 图表查询和任务状态查询是异步函数，使用异步数据库客户端，不会阻塞事件循环
 - 错误处理使用 HTTPException 抛出，由 FastAPI 统一处理
 - 数据库操作使用全局的 _db_handler 实例
 """
 
 import numpy as np
+import asyncio
 import logging
+import orjson
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
 
 from panda_common.handlers.database_handler import DatabaseHandler
 import panda_data
 from datetime import datetime
 from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from bson import ObjectId
 import traceback
 from panda_common.handlers.log_handler import get_factor_logger
@@ -56,11 +65,11 @@ from panda_common.handlers.database_handler import DatabaseHandler
 from panda_common.logger_config import logger
 from panda_factor.generate.macro_factor import MacroFactor
 from ..models.request_body import *
-from ..models.response_body import UserFactorDetailResponse, TaskResult, FactorExcessChartResponse, FactorAnalysisDataResponse, GroupReturnAnalysisResponse, ICDecayChartResponse, ICDensityChartResponse, ICSelfCorrelationChartResponse, ICSequenceChartResponse, LastDateTopFactorResponse, OneGroupDataResponse, RankICDecayChartResponse, RankICDensityChartResponse, RankICSelfCorrelationChartResponse, RankICSequenceChartResponse, ReturnChartResponse, SimpleReturnChartResponse, UserFactorListResponse, UserFactorListItem
+from ..models.response_body import UserFactorDetailResponse, TaskResult, UserFactorListResponse, UserFactorListItem
 from ..models.result_data import *
 from panda_common.config import config
 from panda_common.models.factor_analysis_params import Params
-from typing import Tuple, Optional
+from typing import Tuple, Optional, List
 
 # 全局变量，替代类实例变量
 # 使用全局变量而不是类实例，简化函数调用，避免需要创建服务类实例
@@ -68,6 +77,54 @@ _config = config  # 配置对象
 _db_handler = DatabaseHandler(config)  # 数据库处理器
 panda_data.init()  # 初始化数据读取模块
 
+# 参数校验用的常量集合，模块加载时构建一次，使用 frozenset 做 O(1) 成员判断
+_VALID_SORT_FIELDS = frozenset({"created_at", "return_ratio", "sharpe_ratio", "maximum_drawdown", "IC", "IR"})  # 因子列表排序字段
+_VALID_SORT_ORDERS = frozenset({"asc", "desc"})  # 排序方式
+_VALID_ADJ_CYCLES = frozenset({1, 3, 5, 10, 20, 30})  # 调仓周期
+_VALID_STOCK_POOLS = frozenset({"000300", "000905", "000852", "000985"})  # 股票池
+_VALID_EXTREME = frozenset({"标准差", "std", "中位数", "median"})  # 极值处理方法
+
+# 任务结束时并发写入 tasks 和 user_factors 两个集合使用的线程池
+_finalize_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="finalize_task")
+
+# 任务日志每次最多返回的条数，超出部分由前端带上 last_log_id 继续获取
+_TASK_LOG_PAGE_SIZE = 500
+# 任务日志查询使用的复合索引：按任务筛选、按 _id 排序和增量获取
+# 分页游标只有 last_log_id，排序字段必须与游标一致，否则分页边界处会漏掉或重复日志
+_TASK_LOG_INDEX = [("task_id", 1), ("_id", 1)]
+# _TASK_LOG_INDEX 是否已确认存在；hint 指向不存在的索引时查询会直接报错，因此只有确认后才使用 hint
+_task_log_index_ready = False
+
+# 长轮询等待任务状态变化的最长时间（秒），超时后返回当前状态，由前端重新发起
+_TASK_WAIT_TIMEOUT = 25
+# 不支持变更流时退化为定时轮询的间隔（秒）
+_TASK_WAIT_POLL_INTERVAL = 1
+
+
+def ensure_indexes():
+    """创建本模块查询依赖的索引
+
+    这个函数在服务启动时调用，为高频查询创建索引：
+    - factor_analysis_stage_logs：(task_id, _id)，任务日志的增量轮询可以直接按 _id 范围走索引，
+      不需要全表扫描和内存排序
+    - factor_analysis_results、tasks：task_id，图表查询和任务状态查询都按 task_id 查找
+
+    create_index 是幂等的，索引已存在时不会重复创建。
+
+    Example:
+        >>> ensure_indexes()
+    """
+    global _task_log_index_ready
+    try:
+        _db_handler.get_mongo_collection("panda", "factor_analysis_stage_logs").create_index(_TASK_LOG_INDEX)
+        _task_log_index_ready = True
+        _db_handler.get_mongo_collection("panda", "factor_analysis_results").create_index([("task_id", 1)])
+        _db_handler.get_mongo_collection("panda", "tasks").create_index([("task_id", 1)])
+        logger.info("因子服务索引检查完成")
+    except Exception as e:
+        # 索引创建失败（如权限不足）不影响服务启动，只是查询会变慢
+        logger.warning(f"创建因子服务索引失败: {str(e)}")
+
 def validate_object_id(factor_id: str) -> ObjectId:
     """验证并转换ObjectId
 
@@ -92,11 +149,20 @@ def validate_object_id(factor_id: str) -> ObjectId:
     Example:
         >>> obj_id = validate_object_id("507f1f77bcf86cd799439011")
     """
-    try:
-        return ObjectId(factor_id)
-    except Exception:
+    # 先用 ObjectId.is_valid 做格式检查，避免构造失败时抛出异常的开销
+    if not ObjectId.is_valid(factor_id):
         logger.warning(f"Invalid ObjectId format: {factor_id}")
         raise HTTPException(status_code=400, detail="无效的因子ID格式")
+    return ObjectId(factor_id)
+
+@lru_cache(maxsize=2048)
+def _as_oid(oid_str: str) -> ObjectId:
+    """把字符串转换为 ObjectId 并缓存结果
+
+    前端在任务运行期间每 1~2 秒轮询一次日志，会反复带上同一个 last_log_id，
+    缓存后同一个 ID 只需解析一次。
+    """
+    return ObjectId(oid_str)
 
 def check_factor_exists(user_id: str, factor_name: str, exclude_id: str = None) -> bool:
     """检查因子是否存在
@@ -152,24 +218,49 @@ def format_duration(seconds):
         >>> format_duration(30)
         '30秒'
     """
-    if seconds < 0:
-        return "0秒"
+    # 先统一转换为非负整数秒，后续全部使用整数运算，避免浮点误差
+    total = max(0, int(seconds))
 
     # 将秒数转换为小时、分钟、秒
-    minutes, seconds = divmod(seconds, 60)
-    hours, minutes = divmod(minutes, 60)
+    hours, rem = divmod(total, 3600)
+    minutes, secs = divmod(rem, 60)
 
     result = []
-    if hours > 0:
-        result.append(f"{int(hours)}小时")
-    if minutes > 0:
-        result.append(f"{int(minutes)}分钟")
-    if seconds > 0 or not result:  # 如果没有小时和分钟，至少显示秒
-        result.append(f"{int(seconds)}秒")
+    if hours:
+        result.append(f"{hours}小时")
+    if minutes:
+        result.append(f"{minutes}分钟")
+    if secs or not result:  # 如果没有小时和分钟，至少显示秒
+        result.append(f"{secs}秒")
 
     return "".join(result)
 
 
+def _to_float(value, default: float = 0.0) -> float:
+    """安全地将指标值转换为浮点数
+
+    分析结果中的指标值可能是 "-" 等无法解析的占位符，
+    转换失败时返回默认值，避免单条异常数据导致整个接口失败。
+
+    Args:
+        value: 待转换的值
+        default: 转换失败时的默认值，默认 0.0
+
+    Returns:
+        float: 转换后的浮点数
+
+    Example:
+        >>> _to_float("0.0123")
+        0.0123
+        >>> _to_float("-")
+        0.0
+    """
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
 def hello():
     """测试函数
 
@@ -248,11 +339,10 @@ def get_user_factor_list(
     """
     try:
         # 验证排序参数
-        valid_sort_fields = ["created_at","created_at", "return_ratio", "sharpe_ratio", "maximum_drawdown", "IC", "IR"]
-        if sort_field not in valid_sort_fields:
+        if sort_field not in _VALID_SORT_FIELDS:
             raise HTTPException(status_code=400, detail=f"不支持的排序字段: {sort_field}")
 
-        if sort_order not in ["asc", "desc"]:
+        if sort_order not in _VALID_SORT_ORDERS:
             raise HTTPException(status_code=400, detail=f"不支持的排序方式: {sort_order}")
 
         # 查询用户因子基本信息
@@ -280,22 +370,9 @@ def get_user_factor_list(
         # 查询当前页的数据
         cursor = _db_handler.mongo_client["panda"]["user_factors"].find(query)
 
-        # 将游标转换为列表
-        factor_list = list(cursor)
-
-        if not factor_list:
-            logger.info(f"未找到用户 {user_id} 的因子")
-            return UserFactorListResponse(
-                data=[],
-                total=0,
-                page=page,
-                page_size=page_size,
-                total_pages=0
-            )
-
-        # 处理每个因子的数据
+        # 直接遍历游标处理每个因子的数据，不再先把游标整体转换为列表
         result_list = []
-        for factor in factor_list:
+        for factor in cursor:
             # 获取基本信息
             factor_info = {
                 "name": factor["name"],
@@ -314,11 +391,12 @@ def get_user_factor_list(
             # 获取最新的task_id
             task_id = factor.get("current_task_id")
             if task_id:
-                # 查询性能指标
+                # 查询性能指标，只投影列表展示需要的两个字段
                 analysis_result = _db_handler.mongo_find_one(
                     "panda",
                     "factor_analysis_results",
-                    {"task_id": task_id}
+                    {"task_id": task_id},
+                    projection={"one_group_data": 1, "factor_data_analysis": 1, "_id": 0}
                 )
 
                 if analysis_result:
@@ -341,14 +419,22 @@ def get_user_factor_list(
 
                         for item in analysis_result["factor_data_analysis"]:
                             if item["指标"] == "IC_mean":
-                                # factor_info["IC"] = round(float(item[list(item.keys())[1]]) if item[list(item.keys())[1]] != "-" else 0.0, 4)
-                                factor_info["IC"] = round(float(item[list(item.keys())[1]]),4)
+                                factor_info["IC"] = round(_to_float(item[list(item.keys())[1]]), 4)
                             elif item["指标"] == "IC_IR":
-                                # factor_info["IR"] = round(float(item[list(item.keys())[1]]) if item[list(item.keys())[1]] != "-" else 0.0, 4)
-                                factor_info["IR"] =  round(float(item[list(item.keys())[1]]),4)
+                                factor_info["IR"] = round(_to_float(item[list(item.keys())[1]]), 4)
 
             result_list.append(UserFactorListItem(**factor_info))
 
+        if not result_list:
+            logger.info(f"未找到用户 {user_id} 的因子")
+            return UserFactorListResponse(
+                data=[],
+                total=0,
+                page=page,
+                page_size=page_size,
+                total_pages=0
+            )
+
         # 对结果列表进行排序
         reverse = sort_order == "desc"
         result_list.sort(key=lambda x: getattr(x, sort_field), reverse=reverse)
@@ -371,7 +457,7 @@ def get_user_factor_list(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"获取用户 {user_id} 的因子列表失败: {str(e)}\n{traceback.format_exc()}")
+        logger.exception(f"获取用户 {user_id} 的因子列表失败")
         # raise HTTPException(status_code=500, detail=f"获取因子列表失败: {str(e)}")
         return ResultData.fail("500", f"获取因子列表失败: {str(e)}")
 
@@ -426,10 +512,12 @@ def create_factor(factor: CreateFactorRequest):
             return ResultData.fail("409", "同名因子已存在")
 
         # 准备数据：将请求对象转换为字典，并添加时间戳
+        # 同一次请求只取一次当前时间，保证 created_at 与 updated_at 完全一致
+        now = datetime.now().isoformat()
         factor_dict = factor.dict()
         factor_dict.update({
-            "created_at": datetime.now().isoformat(),
-            "updated_at": datetime.now().isoformat()
+            "created_at": now,
+            "updated_at": now
         })
 
         # 创建因子：将因子数据插入到数据库
@@ -443,7 +531,7 @@ def create_factor(factor: CreateFactorRequest):
         return ResultData.fail("500", "因子创建失败")
 
     except Exception as e:
-        logger.error(f"Failed to create user factor: {str(e)}\n{traceback.format_exc()}")
+        logger.exception("Failed to create user factor")
         return ResultData.fail("500", f"创建因子失败: {str(e)}")
 
 def delete_factor(factor_id: str):
@@ -484,7 +572,7 @@ def delete_factor(factor_id: str):
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Failed to delete user factor: {str(e)}\n{traceback.format_exc()}")
+        logger.exception("Failed to delete user factor")
         return ResultData.fail("500", f"删除因子失败: {str(e)}")
 
 
@@ -562,7 +650,7 @@ def update_factor(factor: CreateFactorRequest, factor_id: str):
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Failed to update user factor: {str(e)}\n{traceback.format_exc()}")
+        logger.exception("Failed to update user factor")
         return ResultData.fail("500", f"更新因子失败: {str(e)}")
 
 
@@ -570,11 +658,9 @@ def query_factor(factor_id: str):
     try:
         object_id = validate_object_id(factor_id)
 
-        # 使用 mongo_find 并获取第一个结果
-        factors = _db_handler.mongo_find("panda", "user_factors", {"_id": object_id})
+        factor = _db_handler.mongo_find_one("panda", "user_factors", {"_id": object_id})
 
-        if factors and len(factors) > 0:
-            factor = factors[0]  # 获取第一个结果
+        if factor is not None:
             # 转换 ObjectId 为字符串
             factor["_id"] = str(factor["_id"])
 
@@ -590,21 +676,25 @@ def query_factor(factor_id: str):
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Failed to query factor: {str(e)}\n{traceback.format_exc()}")
+        logger.exception("Failed to query factor")
         return ResultData.fail("500", f"查询因子失败: {str(e)}")
 
 def query_factor_status(factor_id: str):
     try:
         object_id = validate_object_id(factor_id)
 
-        # 使用 mongo_find 并获取第一个结果
-        factors = _db_handler.mongo_find("panda", "user_factors", {"_id": object_id})
+        # 只投影状态相关字段
+        factor = _db_handler.mongo_find_one(
+            "panda",
+            "user_factors",
+            {"_id": object_id},
+            projection={"status": 1, "current_task_id": 1}
+        )
 
-        if not factors or len(factors) == 0:
+        if factor is None:
             logger.warning(f"Factor not found with ID: {factor_id}")
             return ResultData.fail("404", "未找到指定因子")
 
-        factor = factors[0]  # 获取第一个结果
         # 只返回status字段和current_task_id字段
         status = factor.get("status", 0)
         task_id = factor.get("current_task_id", "unknown")
@@ -615,9 +705,21 @@ def query_factor_status(factor_id: str):
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Failed to query factor status: {str(e)}\n{traceback.format_exc()}")
+        logger.exception("Failed to query factor status")
         return ResultData.fail("500", f"查询因子状态失败: {str(e)}")
 
+@lru_cache(maxsize=1)
+def _get_macro_factor() -> MacroFactor:
+    """获取用于代码校验的 MacroFactor 实例
+
+    validate_factor 不依赖实例上的数据缓存，因此整个进程共享一个实例即可，
+    避免每次运行因子都重新创建数据提供者和数据处理者。第一次调用时才创建。
+
+    Returns:
+        MacroFactor: 共享的因子管理器实例
+    """
+    return MacroFactor()
+
 def validate_factor_params(factor: dict, logger: logging.Logger) -> Tuple[bool, str, Optional[Params]]:
     """验证因子参数
 
@@ -691,15 +793,13 @@ def validate_factor_params(factor: dict, logger: logging.Logger) -> Tuple[bool,
         logger.debug(f"转换为Params对象成功: {params.dict()}")
 
         # 验证调仓周期
-        valid_adjustment_cycles = [1, 3, 5, 10 ,20 ,30]
-        if params.adjustment_cycle not in valid_adjustment_cycles:
+        if params.adjustment_cycle not in _VALID_ADJ_CYCLES:
             error_msg = f"不支持的调仓周期: {params.adjustment_cycle}，只支持[1, 3, 5, 10 ,20 ,30]"
             logger.error(error_msg)
             return False, error_msg, None
 
         # 验证股票池
-        valid_stock_pools = ["000300", "000905", "000852", "000985"]
-        if params.stock_pool not in valid_stock_pools:
+        if params.stock_pool not in _VALID_STOCK_POOLS:
             error_msg = f"不支持的股票池: {params.stock_pool}，只支持000300、000905、000852、000985"
             logger.error(error_msg)
             return False, error_msg, None
@@ -711,8 +811,7 @@ def validate_factor_params(factor: dict, logger: logging.Logger) -> Tuple[bool,
             return False, error_msg, None
 
         # 验证极值处理方法
-        valid_extreme_methods = ["标准差", "std", "中位数", "median"]
-        if params.extreme_value_processing not in valid_extreme_methods:
+        if params.extreme_value_processing not in _VALID_EXTREME:
             error_msg = f"不支持的极值处理方法: {params.extreme_value_processing}，只支持标准差和中位数"
             logger.error(error_msg)
             return False, error_msg, None
@@ -730,8 +829,7 @@ def validate_factor_params(factor: dict, logger: logging.Logger) -> Tuple[bool,
 
         # 验证因子代码
         try:
-            macro_factor = MacroFactor()
-            result = macro_factor.validate_factor(factor.get('code', ''), factor.get('code_type', ''))
+            result = _get_macro_factor().validate_factor(factor.get('code', ''), factor.get('code_type', ''))
             if not result['is_valid']:
                 logger.error("Code validation failed:")
                 logger.error(f"Syntax errors: {result.get('syntax_errors', 'No syntax errors')}")
@@ -813,15 +911,18 @@ def run_factor(message_id: str, is_thread: bool):
             factor_id=factor_id or "unknown"
         )
         logger.debug(f"factor_id: {factor_id}")
-        # 查询因子
-        factors = _db_handler.mongo_find("panda", "user_factors", {"_id": object_id})
+        # 查询因子，只投影运行分析需要的字段
+        factor = _db_handler.mongo_find_one(
+            "panda",
+            "user_factors",
+            {"_id": object_id},
+            projection={"user_id": 1, "factor_name": 1, "params": 1, "code": 1, "code_type": 1}
+        )
 
-        if not factors or len(factors) == 0:
+        if factor is None:
             logger.warning(f"Factor not found with ID: {factor_id}")
             return ResultData.fail("404", "未找到指定因子")
 
-        factor = factors[0]  # 获取第一个结果
-
         # 检查因子是否已经在运行中
         # if factor.get("status") == 1:
         #     logger.info(f"Factor with ID {factor_id} is already running")
@@ -833,6 +934,8 @@ def run_factor(message_id: str, is_thread: bool):
         user_id = factor.get("user_id")
         factor_name = factor.get("factor_name")
         params_dict = factor.get("params", {})
+        # 同一次请求只取一次当前时间，任务记录和因子状态共用
+        now = datetime.now().isoformat()
         # 创建任务记录
         task_record = {
             "task_id": task_id,
@@ -842,9 +945,9 @@ def run_factor(message_id: str, is_thread: bool):
             "task_type": "factor_analysis",
             "params": params_dict,  # 使用Params对象的dict方法获取全部参数
             "status": 1,  # 1: 运行中, 2: 完成, 3: 失败
-            "created_at": datetime.now().isoformat(),
-            "updated_at": datetime.now().isoformat(),
-            "start_time": datetime.now().isoformat(),
+            "created_at": now,
+            "updated_at": now,
+            "start_time": now,
             "end_time": None,
             "error_message": None,
             "result": None
@@ -852,6 +955,8 @@ def run_factor(message_id: str, is_thread: bool):
 
         # 将任务记录保存到MongoDB的tasks集合中
         _db_handler.mongo_insert("panda", "tasks", task_record)
+        # 重新运行会覆盖该因子的分析结果，清理该因子所有旧任务的图表缓存
+        _invalidate_task_cache(task_id, factor_id)
         logger.debug(f"Created task record with ID: {task_id}")
 
         # 更新因子状态为运行中(status=1)
@@ -861,7 +966,7 @@ def run_factor(message_id: str, is_thread: bool):
             {"_id": object_id},
             {
                 "status": 1,  # 运行中
-                "updated_at": datetime.now().isoformat(),
+                "updated_at": now,
                 "current_task_id": task_id,  # 保存当前任务ID
                 "result": {"task_id": task_id}  # 保存任务ID在结果字段中
             }
@@ -882,7 +987,6 @@ def run_factor(message_id: str, is_thread: bool):
 
         if is_thread:
         # 创建后台进程运行因子分析
-            import threading
         # 启动后台线程
             thread = threading.Thread(target=run_factor_analysis, args=(factor_id,start_date, end_date,user_id,factor_name,params,task_id,object_id,logger,))
             thread.daemon = True  # 设置为守护线程，主线程结束时自动退出
@@ -897,9 +1001,27 @@ def run_factor(message_id: str, is_thread: bool):
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Failed to start factor analysis: {str(e)}\n{traceback.format_exc()}")
+        logger.exception("Failed to start factor analysis")
         return ResultData.fail("500", f"启动因子分析失败: {str(e)}")
 
+def _finalize_task(task_id: str, object_id: ObjectId, task_update: dict, factor_update: dict) -> None:
+    """任务结束时同时更新任务记录和因子状态
+
+    两个更新分别写入 tasks 和 user_factors 两个集合，彼此独立，
+    因此把其中一个交给线程池、另一个在当前线程执行，两次数据库往返并发进行。
+
+    Args:
+        task_id: 任务ID
+        object_id: 因子的 MongoDB ObjectId
+        task_update: 写入 tasks 集合的字段
+        factor_update: 写入 user_factors 集合的字段
+    """
+    task_future = _finalize_executor.submit(
+        _db_handler.mongo_update, "panda", "tasks", {"task_id": task_id}, task_update
+    )
+    _db_handler.mongo_update("panda", "user_factors", {"_id": object_id}, factor_update)
+    task_future.result()
+
 def run_factor_analysis(factor_id: str, start_date: str, end_date: str, user_id: str, factor_name: str, params: Params, task_id: str, object_id: ObjectId, logger: logging.Logger) -> None:
     """运行因子分析（实际执行函数）
 
@@ -974,28 +1096,22 @@ def run_factor_analysis(factor_id: str, start_date: str, end_date: str, user_id:
         # 运行因子分析：调用 factor_analysis 函数进行完整的分析
         factor_analysis(df_factor, params, factor_id, task_id, logger)
 
-        # 线程内部执行完成后更新状态
-        _db_handler.mongo_update(
-            "panda",
-            "tasks",
-            {"task_id": task_id},
+        # 线程内部执行完成后更新任务状态为完成、因子状态为已完成(status=2)
+        # 两个文档使用同一个结束时间，方便关联
+        now = datetime.now().isoformat()
+        _finalize_task(
+            task_id,
+            object_id,
             {
                 "status": 2,  # 完成
-                "updated_at": datetime.now().isoformat(),
-                "end_time": datetime.now().isoformat(),
+                "updated_at": now,
+                "end_time": now,
                 "result": "分析完成"
-            }
-        )
-
-        # 更新因子状态为已完成(status=2)
-        _db_handler.mongo_update(
-            "panda",
-            "user_factors",
-            {"_id": object_id},
+            },
             {
                 "status": 2,  # 已完成
-                "updated_at": datetime.now().isoformat(),
-                "last_run_at": datetime.now().isoformat(),
+                "updated_at": now,
+                "last_run_at": now,
                 "result": {"task_id": task_id},
                 "current_task_id": task_id
             }
@@ -1004,32 +1120,29 @@ def run_factor_analysis(factor_id: str, start_date: str, end_date: str, user_id:
         error_msg = f"因子分析失败: {str(e)}\n{traceback.format_exc()}"
         logger.error(error_msg)
 
-        # 更新任务状态为失败
-        _db_handler.mongo_update(
-            "panda",
-            "tasks",
-            {"task_id": task_id},
+        # 更新任务状态和因子状态为失败(status=3)
+        now = datetime.now().isoformat()
+        _finalize_task(
+            task_id,
+            object_id,
             {
                 "status": 3,  # 失败
-                "updated_at": datetime.now().isoformat(),
-                "end_time": datetime.now().isoformat(),
+                "updated_at": now,
+                "end_time": now,
                 "error_message": error_msg
-            }
-        )
-
-        # 更新因子状态为失败(status=3)
-        _db_handler.mongo_update(
-            "panda",
-            "user_factors",
-            {"_id": object_id},
+            },
             {
                 "status": 3,  # 失败
-                "updated_at": datetime.now().isoformat(),
-                "last_run_at": datetime.now().isoformat(),
+                "updated_at": now,
+                "last_run_at": now,
                 "result": {"error": error_msg}
             }
         )
-def query_task_status(task_id: str):
+    finally:
+        # 分析结果已写入（或任务失败），清理运行期间可能缓存的图表数据
+        _invalidate_task_cache(task_id, factor_id)
+
+async def query_task_status(task_id: str):
     """
     查询任务状态接口
 
@@ -1044,606 +1157,561 @@ def query_task_status(task_id: str):
         query = {"task_id": task_id}
 
         # 查询任务
-        tasks = _db_handler.mongo_find("panda", "tasks", query)
+        task = await _db_handler.async_mongo_find_one("panda", "tasks", query)
 
-        if not tasks:
+        if task is None:
             return ResultData.fail("404", "未找到指定任务")
 
-        task = tasks[0]
-
-        # 提取需要的字段
-        result = TaskResult(
-            process_status=task.get("process_status"),
-            error_message=task.get("error_message"),
-            result=task.get("result"),
-            last_log_message=task.get("last_log_message"),
-            last_log_time=task.get("last_log_time"),
-            task_id=task.get("task_id"),
-            factor_id=task.get("factor_id"),
-            user_id=task.get("user_id"),
-            factor_name=task.get("factor_name")
-        )
-
         logger.info(f"Successfully queried task: {task_id}")
-        return ResultData.success(data=result)
+        return ResultData.success(data=_to_task_result(task))
+    except Exception as e:
+        logger.exception("Failed to query task")
+        return ResultData.fail("500", f"查询任务失败: {str(e)}")
+
+def _to_task_result(task: dict) -> TaskResult:
+    """从任务文档中提取需要返回给前端的字段"""
+    return TaskResult(
+        process_status=task.get("process_status"),
+        error_message=task.get("error_message"),
+        result=task.get("result"),
+        last_log_message=task.get("last_log_message"),
+        last_log_time=task.get("last_log_time"),
+        task_id=task.get("task_id"),
+        factor_id=task.get("factor_id"),
+        user_id=task.get("user_id"),
+        factor_name=task.get("factor_name")
+    )
+
+def _task_changed(task: dict, last_process_status: int, last_log_message: Optional[str]) -> bool:
+    """判断任务相对前端已知的状态是否有变化
+
+    处理状态或最新进度日志变化时需要返回；已结束（成功或失败）的任务不会再变化，也视为需要返回。
+    """
+    return (
+        task.get("process_status") != last_process_status
+        or task.get("last_log_message") != last_log_message
+        or task.get("status") in (2, 3)
+    )
+
+class _TaskWatch:
+    """同一个 task_id 的所有长轮询请求共享的变更流
+
+    每个等待中的请求各开一个变更流，会各占用一个服务端游标和一个连接池连接。
+    这里每个 task_id 只开一个变更流，由后台协程读取，收到更新后唤醒所有等待的请求；
+    最后一个等待者离开时关闭变更流。
+
+    Attributes:
+        ready: 变更流已经打开（或打开失败）时置位
+        failed: 变更流不可用（如单机部署的 MongoDB），等待者需要改为定时查询
+        doc: 最近一次收到的任务文档
+        changed: 收到新的任务文档时置位；每次通知后替换为新的 Event
+    """
+
+    def __init__(self, task_id: str):
+        self.waiters = 0
+        self.ready = asyncio.Event()
+        self.failed = False
+        self.doc = None
+        self.changed = asyncio.Event()
+        self.runner = asyncio.create_task(self._run(task_id))
+
+    def _notify(self):
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+    async def _run(self, task_id: str):
+        pipeline = [{"$match": {
+            "operationType": {"$in": ["update", "replace"]},
+            "fullDocument.task_id": task_id
+        }}]
+        try:
+            collection = _db_handler.get_async_mongo_collection("panda", "tasks")
+            async with await collection.watch(pipeline, full_document="updateLookup", max_await_time_ms=1000) as stream:
+                self.ready.set()
+                async for change in stream:
+                    doc = change.get("fullDocument")
+                    if doc is not None:
+                        self.doc = doc
+                        self._notify()
+        except Exception as e:
+            # 后台协程中的异常没有调用方接收，这里记录后统一转为定时查询
+            logger.debug(f"任务状态变更流不可用，改为定时查询: {str(e)}")
+        # 变更流打开失败或中途断开，通知等待者改为定时查询
+        self.failed = True
+        self.ready.set()
+        self._notify()
+
+# 正在被长轮询的任务：task_id -> _TaskWatch
+_task_watches = {}
+
+async def _wait_task_change(task_id: str, last_process_status: int, last_log_message: Optional[str], deadline: float) -> Optional[dict]:
+    """等待任务状态或进度日志发生变化，返回变化后的任务文档；超时返回 None
+
+    优先使用该任务共享的变更流（_TaskWatch），由 MongoDB 在任务更新时主动推送；
+    单机部署的 MongoDB 不支持变更流，此时退化为每 _TASK_WAIT_POLL_INTERVAL 秒查询一次。
+    """
+    query = {"task_id": task_id}
+    watch = _task_watches.get(task_id)
+    if watch is None:
+        watch = _task_watches[task_id] = _TaskWatch(task_id)
+    watch.waiters += 1
+    try:
+        try:
+            await asyncio.wait_for(watch.ready.wait(), max(deadline - time.monotonic(), 0))
+        except asyncio.TimeoutError:
+            return None
+        if not watch.failed:
+            # 先取出当前的 Event 再查询：查询期间到达的更新也能唤醒下面的等待
+            changed = watch.changed
+            # 变更流打开之前任务可能已经更新，再查一次避免错过这次变化
+            task = await _db_handler.async_mongo_find_one("panda", "tasks", query)
+            if task is None or _task_changed(task, last_process_status, last_log_message):
+                return task
+            while not watch.failed:
+                try:
+                    await asyncio.wait_for(changed.wait(), max(deadline - time.monotonic(), 0))
+                except asyncio.TimeoutError:
+                    return None
+                changed = watch.changed
+                task = watch.doc
+                if task is not None and _task_changed(task, last_process_status, last_log_message):
+                    return task
+    finally:
+        watch.waiters -= 1
+        if watch.waiters == 0:
+            # 最后一个等待者离开，关闭变更流
+            watch.runner.cancel()
+            if _task_watches.get(task_id) is watch:
+                del _task_watches[task_id]
+
+    while time.monotonic() < deadline:
+        await asyncio.sleep(_TASK_WAIT_POLL_INTERVAL)
+        task = await _db_handler.async_mongo_find_one("panda", "tasks", query)
+        if task is None or _task_changed(task, last_process_status, last_log_message):
+            return task
+    return None
+
+async def wait_task_status(task_id: str, last_process_status: Optional[int] = None, timeout: float = _TASK_WAIT_TIMEOUT):
+    """
+    长轮询查询任务状态接口
+
+    前端在任务运行期间每秒调用一次 query_task_status，大部分请求拿到的都是相同的状态。
+    这个接口带上前端当前已知的 process_status，状态和进度日志都没有变化时会挂起等待，
+    直到状态变化、写入新的进度日志、任务结束或超过 timeout 秒才返回，大幅减少对 tasks 集合的查询次数。
+
+    参数:
+    - task_id: 任务ID
+    - last_process_status: 前端当前已知的处理状态，为空时立即返回当前状态
+    - timeout: 最长等待时间（秒）
+
+    返回:
+    - 任务状态信息，格式与 query_task_status 相同
+    """
+    try:
+        deadline = time.monotonic() + timeout
+        task = await _db_handler.async_mongo_find_one("panda", "tasks", {"task_id": task_id})
+
+        if task is None:
+            return ResultData.fail("404", "未找到指定任务")
+
+        if last_process_status is not None and not _task_changed(task, last_process_status, task.get("last_log_message")):
+            # 以本次读到的进度日志为基准等待；超时或任务被删除时返回最后一次读到的状态
+            task = await _wait_task_change(task_id, last_process_status, task.get("last_log_message"), deadline) or task
+
+        return ResultData.success(data=_to_task_result(task))
     except Exception as e:
-        logger.error(f"Failed to query task: {str(e)}\n{traceback.format_exc()}")
+        logger.exception("Failed to wait for task status")
         return ResultData.fail("500", f"查询任务失败: {str(e)}")
 
 def get_task_logs(task_id: str, last_log_id: str = None):
     """
     获取任务日志
+
+    每次最多返回 _TASK_LOG_PAGE_SIZE 条日志。前端把返回的 last_log_id 带到下一次请求中，
+    即可从上次结束的位置继续获取；has_more 为 True 表示还有未取完的日志，可以立即再次请求。
+
     :param task_id: 任务ID
     :param last_log_id: 上次获取的最后一个日志ID，用于增量获取
-    :return: 日志消息列表，每个元素包含message、loglevel和timestamp
+    :return: 日志消息列表（每个元素包含message、loglevel和timestamp）、last_log_id 和 has_more
     """
     try:
-        _db_handler = DatabaseHandler(config)
-
         # 构建查询条件
         query = {"task_id": task_id}
         if last_log_id:
             # 直接查询_id大于last_log_id的文档
-            query["_id"] = {"$gt": ObjectId(last_log_id)}
+            query["_id"] = {"$gt": _as_oid(last_log_id)}
+
+        # 只要字段完整的日志
+        query.update({
+            "message": {"$exists": True},
+            "level": {"$exists": True},
+            "timestamp": {"$exists": True}
+        })
 
-        # 查询日志并按时间戳排序
-        logs = _db_handler.mongo_find(
+        # 查询日志并按 _id 排序，字段筛选和重命名（level -> loglevel）在数据库端完成
+        # 排序字段与分页游标 last_log_id 一致，每页最多 _TASK_LOG_PAGE_SIZE 条，翻页时不会漏掉或重复日志；
+        # 日志由任务按顺序写入，_id 的顺序即写入顺序
+        # 索引已确认存在时通过 hint 直接指定，省去查询计划器每次选择索引的开销
+        pipeline = [
+            {"$match": query},
+            {"$sort": {"_id": 1}},  # 按写入顺序升序排序
+            {"$limit": _TASK_LOG_PAGE_SIZE},
+            {"$project": {"_id": 1, "message": 1, "loglevel": "$level", "timestamp": 1}}
+        ]
+        log_list = _db_handler.mongo_aggregate(
             "panda",
             "factor_analysis_stage_logs",
-            query,
-            sort=[("timestamp", 1)]  # 按时间戳升序排序
+            pipeline,
+            batch_size=_TASK_LOG_PAGE_SIZE,
+            hint=_TASK_LOG_INDEX if _task_log_index_ready else None
         )
 
-        # 构建日志列表
-        log_list = []
-        for log in logs:
-            if "message" in log and "level" in log and "timestamp" in log:
-                log_list.append({
-                    "message": log["message"],
-                    "loglevel": log["level"],
-                    "timestamp": log["timestamp"]
-                })
-            
-        # 获取最后一个日志的ID
-        last_log_id = str(logs[-1]["_id"]) if logs else None
+        # 取出 _id（不返回给前端），同时记录最后一个日志的ID
+        last_log_id = None
+        for log in log_list:
+            last_log_id = log.pop("_id")
+        if last_log_id is not None:
+            last_log_id = str(last_log_id)
 
         return {
             "code": 200,
             "message": "获取日志成功",
             "data": {
                 "logs": log_list,
-                "last_log_id": last_log_id  # 返回最后一个_id
+                "last_log_id": last_log_id,  # 返回最后一个_id
+                "has_more": len(log_list) >= _TASK_LOG_PAGE_SIZE  # 是否还有未返回的日志
             }
         }
 
     except Exception as e:
-        print(f"获取任务日志时出错: {str(e)}")
+        logger.exception(f"获取任务 {task_id} 的日志时出错")
         raise HTTPException(
             status_code=500,
             detail=f"获取任务日志失败: {str(e)}"
         )
 
-def query_group_return_analysis(task_id: str):
-    """
-    查询分组收益分析数据
-    :param task_id: 任务ID
-    :return: 分组收益分析数据
-    """
-    try:
-        # 从数据库中查询结果
-        result = _db_handler.mongo_find_one(
-            "panda",
-            "factor_analysis_results",
-            {"task_id": task_id}
-        )
-
-        if not result:
-            logger.warning(f"未找到任务 {task_id} 的分析结果")
-            return ResultData.fail("404", f"未找到任务 {task_id} 的分析结果")
-
-        # 构造响应数据
-        response = GroupReturnAnalysisResponse(
-            task_id=task_id,
-            group_return_analysis=result.get("group_return_analysis", [])
-        )
 
-        logger.info(f"成功查询到任务 {task_id} 的分组收益分析数据")
-        return ResultData(
-            code="200",
-            message="查询成功",
-            data=response.model_dump()
-        )
+class _TTLCache:
+    """带过期时间的 LRU 内存缓存（线程安全）
 
-    except Exception as e:
-        logger.error(f"查询分组收益分析数据失败: {str(e)}\n{traceback.format_exc()}")
-        return ResultData.fail("500", f"查询分组收益分析数据失败: {str(e)}")
+    因子分析在后台线程中运行，结束时需要从请求线程之外清理缓存，因此所有操作都加锁。
+    超过 maxsize 时淘汰最久未使用的条目，超过 ttl 秒的条目视为失效。
 
-def query_ic_decay_chart(task_id: str):
-    """
-    查询因子IC衰减图数据
-    :param task_id: 任务ID
-    :return: IC衰减图数据
+    Args:
+        maxsize: 最多缓存的条目数
+        ttl: 条目有效期（秒）
     """
-    try:
-        # 从数据库中查询结果
-        result = _db_handler.mongo_find_one(
-            "panda",
-            "factor_analysis_results",
-            {"task_id": task_id}
-        )
 
-        if not result:
-            logger.warning(f"未找到任务 {task_id} 的分析结果")
-            return ResultData.fail("404", f"未找到任务 {task_id} 的分析结果")
-
-        # 构造响应数据
-        response = ICDecayChartResponse(
-            task_id=task_id,
-            ic_decay_chart=result.get("ic_decay_chart")
-        )
-
-        logger.info(f"成功查询到任务 {task_id} 的IC衰减图数据")
-        return ResultData(
-            code="200",
-            message="查询成功",
-            data=response.model_dump()
-        )
-
-    except Exception as e:
-        logger.error(f"查询IC衰减图数据失败: {str(e)}\n{traceback.format_exc()}")
-        return ResultData.fail("500", f"查询IC衰减图数据失败: {str(e)}")
-
-def query_ic_density_chart(task_id: str):
+    def __init__(self, maxsize: int, ttl: float):
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """读取缓存，不存在或已过期时返回 None"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expire_at, value = item
+            if expire_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        with self._lock:
+            self._data[key] = (time.monotonic() + self._ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self._maxsize:
+                self._data.popitem(last=False)
+
+    def discard(self, key):
+        """删除指定条目，不存在时忽略"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def discard_where(self, predicate):
+        """删除所有满足 predicate(key, value) 的条目"""
+        with self._lock:
+            for key in [k for k, (_, v) in self._data.items() if predicate(k, v)]:
+                del self._data[key]
+
+
+# 图表数据缓存：(task_id, 字段名) -> (factor_id, 只包含该字段的结果字典)
+# 打开结果页时前端会在短时间内请求十几个图表，命中缓存时不再访问数据库。
+# 分析结果按 factor_id 覆盖写入，因子重新运行后旧 task_id 的结果就不存在了，
+# 因此本进程中由 _invalidate_task_cache 按因子清理；其他工作进程收不到清理通知，
+# TTL 取得很短，多进程部署下过期数据最多保留 30 秒
+_chart_cache = _TTLCache(maxsize=1024, ttl=30)
+
+# 不存在分析结果的任务：task_id -> True
+# 前端可能持续轮询错误或已过期的 task_id，短时间内直接返回 404，不再访问数据库。
+# TTL 很短，任务结果写入后最多延迟几秒即可查到
+_missing_task_cache = _TTLCache(maxsize=1024, ttl=5)
+
+
+def _invalidate_task_cache(task_id: str, factor_id: str) -> None:
+    """清理指定任务及同一因子所有旧任务的图表缓存，在任务开始运行和运行结束时调用"""
+    _chart_cache.discard_where(lambda key, value: key[0] == task_id or value[0] == factor_id)
+    _missing_task_cache.discard(task_id)
+
+
+# 图表字段配置：结果文档中的字段名 -> (字段缺失时的默认值, 中文描述)
+# 所有图表查询接口都只是从 factor_analysis_results 中取出一个字段返回，
+# 统一由 _query_chart 处理，新增图表只需要在这里登记。
+# 数据直接透传数据库中的字段，不经过响应模型校验；各字段的数据结构见 models/response_body.py
+CHART_FIELDS = {
+    "group_return_analysis": ([], "分组收益分析数据"),
+    "ic_decay_chart": (None, "IC衰减图数据"),
+    "ic_den_chart": (None, "IC分布图数据"),
+    "ic_self_correlation_chart": (None, "IC自相关图数据"),
+    "ic_seq_chart": (None, "IC序列图数据"),
+    "rank_ic_decay_chart": (None, "Rank IC衰减图数据"),
+    "rank_ic_den_chart": (None, "Rank IC分布图数据"),
+    "rank_ic_self_correlation_chart": (None, "Rank IC自相关图数据"),
+    "rank_ic_seq_chart": (None, "Rank IC序列图数据"),
+    "last_date_top_factor": ([], "最新日期因子值数据"),
+    "one_group_data": (None, "单组数据分析结果"),
+    "excess_chart": (None, "超额收益图表数据"),
+    "factor_data_analysis": ([], "因子分析数据"),
+    "return_chart": (None, "收益率图表数据"),
+    "simple_return_chart": (None, "单组收益率图表数据"),
+}
+
+
+def _build_chart_data(task_id: str, field_name: str, result: dict) -> dict:
+    """取出结果文档中的一个图表字段，组装成 {"task_id": ..., 字段名: 数据} 结构的字典
+
+    图表数据只是原样转发给前端，经过响应模型校验再导出不会带来任何价值，
+    对体积较大的收益率曲线反而是主要开销。这里直接透传数据库中的字段，由 orjson 一次编码输出。
     """
-    查询因子IC分布图数据
-    :param task_id: 任务ID
-    :return: IC分布图数据
-    """
-    try:
-        # 从数据库中查询结果
-        result = _db_handler.mongo_find_one(
-            "panda",
-            "factor_analysis_results",
-            {"task_id": task_id}
-        )
+    default = CHART_FIELDS[field_name][0]
+    return {"task_id": task_id, field_name: result.get(field_name, default)}
 
-        if not result:
-            logger.warning(f"未找到任务 {task_id} 的分析结果")
-            return ResultData.fail("404", f"未找到任务 {task_id} 的分析结果")
 
-        # 构造响应数据
-        response = ICDensityChartResponse(
-            task_id=task_id,
-            ic_den_chart=result.get("ic_den_chart")
-        )
+# 查询成功时的提示信息
+_SUCCESS_MSG = "查询成功"
 
-        logger.info(f"成功查询到任务 {task_id} 的IC分布图数据")
-        return ResultData(
-            code="200",
-            message="查询成功",
-            data=response.model_dump()
-        )
+# 流式输出成功响应时的固定开头，与 ResultData(code="200", message=_SUCCESS_MSG, data={...}) 的 JSON 格式一致
+_STREAM_SUCCESS_PREFIX = b'{"code":"200","message":"' + _SUCCESS_MSG.encode() + b'","data":{'
 
-    except Exception as e:
-        logger.error(f"查询IC分布图数据失败: {str(e)}\n{traceback.format_exc()}")
-        return ResultData.fail("500", f"查询IC分布图数据失败: {str(e)}")
 
-def query_ic_self_correlation_chart(task_id: str):
-    """
-    查询因子IC自相关图数据
-    :param task_id: 任务ID
-    :return: IC自相关图数据
-    """
-    try:
-        # 从数据库中查询结果
-        result = _db_handler.mongo_find_one(
-            "panda",
-            "factor_analysis_results",
-            {"task_id": task_id}
-        )
+def _stream_success(items) -> StreamingResponse:
+    """以流式方式输出查询成功的响应
 
-        if not result:
-            logger.warning(f"未找到任务 {task_id} 的分析结果")
-            return ResultData.fail("404", f"未找到任务 {task_id} 的分析结果")
+    图表数据（尤其是收益率、超额收益曲线）体积较大，拼成一个完整的字典再整体序列化、
+    再把各部分拼接成一整块 bytes 会占用较多内存。这里按字段逐个用 orjson 编码，
+    各字段的编码结果作为独立的片段依次输出，输出的 JSON 与 ResultData 成功响应完全相同。
 
-        # 构造响应数据
-        response = ICSelfCorrelationChartResponse(
-            task_id=task_id,
-            ic_self_correlation_chart=result.get("ic_self_correlation_chart")
-        )
+    所有字段在创建响应之前就完成编码：响应头一旦发出就无法再改成 500，
+    如果在输出过程中才遇到 orjson 无法编码的值（如结果文档中残留的 ObjectId），客户端只会收到截断的响应体。
+    提前编码时异常由调用方捕获，返回正常的错误响应。
 
-        logger.info(f"成功查询到任务 {task_id} 的IC自相关图数据")
-        return ResultData(
-            code="200",
-            message="查询成功",
-            data=response.model_dump()
-        )
+    Args:
+        items: data 字段中的 (键, 值) 序列，可以是生成器
 
-    except Exception as e:
-        logger.error(f"查询IC自相关图数据失败: {str(e)}\n{traceback.format_exc()}")
-        return ResultData.fail("500", f"查询IC自相关图数据失败: {str(e)}")
+    Returns:
+        StreamingResponse: application/json 格式的流式响应
 
-def query_ic_sequence_chart(task_id: str):
-    """
-    查询因子IC序列图数据
-    :param task_id: 任务ID
-    :return: IC序列图数据
+    Raises:
+        orjson.JSONEncodeError: 数据中包含无法编码的值
     """
-    try:
-        # 从数据库中查询结果
-        result = _db_handler.mongo_find_one(
-            "panda",
-            "factor_analysis_results",
-            {"task_id": task_id}
-        )
-
-        if not result:
-            logger.warning(f"未找到任务 {task_id} 的分析结果")
-            return ResultData.fail("404", f"未找到任务 {task_id} 的分析结果")
+    chunks = [_STREAM_SUCCESS_PREFIX]
+    separator = b""
+    for key, value in items:
+        chunks.append(separator + orjson.dumps(key) + b":" + orjson.dumps(value))
+        separator = b","
+    chunks.append(b"}}")
 
-        # 构造响应数据
-        response = ICSequenceChartResponse(
-            task_id=task_id,
-            ic_seq_chart=result.get("ic_seq_chart")
-        )
+    return StreamingResponse(iter(chunks), media_type="application/json")
 
-        logger.info(f"成功查询到任务 {task_id} 的IC序列图数据")
-        return ResultData(
-            code="200",
-            message="查询成功",
-            data=response.model_dump()
-        )
-
-    except Exception as e:
-        logger.error(f"查询IC序列图数据失败: {str(e)}\n{traceback.format_exc()}")
-        return ResultData.fail("500", f"查询IC序列图数据失败: {str(e)}")
 
-def query_rank_ic_decay_chart(task_id: str):
-    """
-    查询因子Rank IC衰减图数据
-    :param task_id: 任务ID
-    :return: Rank IC衰减图数据
-    """
-    try:
-        # 从数据库中查询结果
-        result = _db_handler.mongo_find_one(
-            "panda",
-            "factor_analysis_results",
-            {"task_id": task_id}
-        )
+async def _fetch_chart_fields(task_id: str, fields: List[str]) -> Optional[dict]:
+    """读取任务分析结果中的若干字段，优先使用缓存
 
-        if not result:
-            logger.warning(f"未找到任务 {task_id} 的分析结果")
-            return ResultData.fail("404", f"未找到任务 {task_id} 的分析结果")
+    缓存中没有的字段会用一次带投影的查询取回，并按字段写入缓存。
 
-        # 构造响应数据
-        response = RankICDecayChartResponse(
-            task_id=task_id,
-            rank_ic_decay_chart=result.get("rank_ic_decay_chart")
-        )
-
-        logger.info(f"成功查询到任务 {task_id} 的Rank IC衰减图数据")
-        return ResultData(
-            code="200",
-            message="查询成功",
-            data=response.model_dump()
-        )
-
-    except Exception as e:
-        logger.error(f"查询Rank IC衰减图数据失败: {str(e)}\n{traceback.format_exc()}")
-        return ResultData.fail("500", f"查询Rank IC衰减图数据失败: {str(e)}")
+    Args:
+        task_id: 任务ID
+        fields: 需要的字段列表，必须是 CHART_FIELDS 的键
 
-def query_rank_ic_density_chart(task_id: str):
-    """
-    查询因子Rank IC分布图数据
-    :param task_id: 任务ID
-    :return: Rank IC分布图数据
+    Returns:
+        Optional[dict]: 包含所需字段的字典（结果文档中没有的字段不会出现）；
+        如果任务的分析结果不存在，返回 None
     """
-    try:
-        # 从数据库中查询结果
-        result = _db_handler.mongo_find_one(
-            "panda",
-            "factor_analysis_results",
-            {"task_id": task_id}
-        )
+    # 近期已确认不存在的任务直接返回
+    if _missing_task_cache.get(task_id) is not None:
+        return None
+
+    result = {}
+    missing = []
+    for f in fields:
+        cached = _chart_cache.get((task_id, f))
+        if cached is None:
+            missing.append(f)
+        else:
+            result.update(cached[1])
 
-        if not result:
-            logger.warning(f"未找到任务 {task_id} 的分析结果")
-            return ResultData.fail("404", f"未找到任务 {task_id} 的分析结果")
+    if not missing:
+        return result
 
-        # 构造响应数据
-        response = RankICDensityChartResponse(
-            task_id=task_id,
-            rank_ic_den_chart=result.get("rank_ic_den_chart")
-        )
+    # 只投影缺失的字段，避免拉取整个结果文档中的所有图表；factor_id 用于按因子清理缓存
+    projection = {f: 1 for f in missing}
+    projection["factor_id"] = 1
+    projection["_id"] = 0
+    doc = await _db_handler.async_mongo_find_one(
+        "panda",
+        "factor_analysis_results",
+        {"task_id": task_id},
+        projection=projection
+    )
 
-        logger.info(f"成功查询到任务 {task_id} 的Rank IC分布图数据")
-        return ResultData(
-            code="200",
-            message="查询成功",
-            data=response.model_dump()
-        )
+    # 投影后文档存在但缺少字段时会返回空字典，因此这里只判断 None
+    if doc is None:
+        _missing_task_cache.set(task_id, True)
+        return None
 
-    except Exception as e:
-        logger.error(f"查询Rank IC分布图数据失败: {str(e)}\n{traceback.format_exc()}")
-        return ResultData.fail("500", f"查询Rank IC分布图数据失败: {str(e)}")
+    factor_id = doc.get("factor_id")
+    for f in missing:
+        part = {f: doc[f]} if f in doc else {}
+        _chart_cache.set((task_id, f), (factor_id, part))
+        result.update(part)
+    return result
 
-def query_rank_ic_self_correlation_chart(task_id: str):
-    """
-    查询因子Rank IC自相关图数据
-    :param task_id: 任务ID
-    :return: Rank IC自相关图数据
-    """
-    try:
-        # 从数据库中查询结果
-        result = _db_handler.mongo_find_one(
-            "panda",
-            "factor_analysis_results",
-            {"task_id": task_id}
-        )
 
-        if not result:
-            logger.warning(f"未找到任务 {task_id} 的分析结果")
-            return ResultData.fail("404", f"未找到任务 {task_id} 的分析结果")
+async def _query_chart(task_id: str, field_name: str):
+    """查询分析结果中的单个图表字段
 
-        # 构造响应数据
-        response = RankICSelfCorrelationChartResponse(
-            task_id=task_id,
-            rank_ic_self_correlation_chart=result.get("rank_ic_self_correlation_chart")
-        )
+    这个函数是所有图表查询接口的公共实现：从 factor_analysis_results 中
+    找到任务对应的结果文档，取出指定字段，组装成 {"task_id": ..., 字段名: 数据} 的结构后返回。
 
-        logger.info(f"成功查询到任务 {task_id} 的Rank IC自相关图数据")
-        return ResultData(
-            code="200",
-            message="查询成功",
-            data=response.model_dump()
-        )
+    Args:
+        task_id: 任务ID
+        field_name: 结果文档中的字段名，必须是 CHART_FIELDS 的键
 
-    except Exception as e:
-        logger.error(f"查询Rank IC自相关图数据失败: {str(e)}\n{traceback.format_exc()}")
-        return ResultData.fail("500", f"查询Rank IC自相关图数据失败: {str(e)}")
+    Returns:
+        ResultData: 查询结果，data 为 {"task_id": ..., 字段名: 数据} 结构的字典
 
-def query_rank_ic_sequence_chart(task_id: str):
-    """
-    查询因子Rank IC序列图数据
-    :param task_id: 任务ID
-    :return: Rank IC序列图数据
+    Example:
+        >>> result = await _query_chart("task_456", "ic_decay_chart")
     """
+    label = CHART_FIELDS[field_name][1]
     try:
-        # 从数据库中查询结果
-        result = _db_handler.mongo_find_one(
-            "panda",
-            "factor_analysis_results",
-            {"task_id": task_id}
-        )
+        # 查询结果（优先使用缓存）
+        result = await _fetch_chart_fields(task_id, [field_name])
 
-        if not result:
+        if result is None:
             logger.warning(f"未找到任务 {task_id} 的分析结果")
             return ResultData.fail("404", f"未找到任务 {task_id} 的分析结果")
 
         # 构造响应数据
-        response = RankICSequenceChartResponse(
-            task_id=task_id,
-            rank_ic_seq_chart=result.get("rank_ic_seq_chart")
-        )
-
-        logger.info(f"成功查询到任务 {task_id} 的Rank IC序列图数据")
-        return ResultData(
-            code="200",
-            message="查询成功",
-            data=response.model_dump()
-        )
-
-    except Exception as e:
-        logger.error(f"查询Rank IC序列图数据失败: {str(e)}\n{traceback.format_exc()}")
-        return ResultData.fail("500", f"查询Rank IC序列图数据失败: {str(e)}")
-
-def query_last_date_top_factor(task_id: str):
-    """
-    查询最新日期的因子值数据
-    :param task_id: 任务ID
-    :return: 最新日期的因子值数据
-    """
-    try:
-        # 从数据库中查询结果
-        result = _db_handler.mongo_find_one(
-            "panda",
-            "factor_analysis_results",
-            {"task_id": task_id}
-        )
-
-        if not result:
-            logger.warning(f"未找到任务 {task_id} 的分析结果")
-            return ResultData.fail("404", f"未找到任务 {task_id} 的分析结果")
-        result.get("last_date_top_factor", [])
-        # 构造响应数据
-        response = LastDateTopFactorResponse(
-            task_id=task_id,
-            last_date_top_factor=result.get("last_date_top_factor", [])
-        )
+        data = _build_chart_data(task_id, field_name, result)
 
-        logger.info(f"成功查询到任务 {task_id} 的最新日期因子值数据")
-        return ResultData(
-            code="200",
-            message="查询成功",
-            data=response.model_dump()
-        )
+        logger.info(f"成功查询到任务 {task_id} 的{label}")
+        return _stream_success(data.items())
 
     except Exception as e:
-        logger.error(f"查询最新日期因子值数据失败: {str(e)}\n{traceback.format_exc()}")
-        return ResultData.fail("500", f"查询最新日期因子值数据失败: {str(e)}")
+        logger.exception(f"查询{label}失败")
+        return ResultData.fail("500", f"查询{label}失败: {str(e)}")
 
-def query_one_group_data(task_id: str):
-    """
-    查询单组数据分析结果
-    :param task_id: 任务ID
-    :return: 单组数据分析结果
-    """
-    try:
-        # 从数据库中查询结果
-        result = _db_handler.mongo_find_one(
-            "panda",
-            "factor_analysis_results",
-            {"task_id": task_id}
-        )
 
-        if not result:
-            logger.warning(f"未找到任务 {task_id} 的分析结果")
-            return ResultData.fail("404", f"未找到任务 {task_id} 的分析结果")
+async def query_all_charts(task_id: str, fields: Optional[List[str]] = None):
+    """一次性查询多个图表数据
 
-        # 构造响应数据
-        response = OneGroupDataResponse(
-            task_id=task_id,
-            one_group_data=result.get("one_group_data")
-        )
+    前端打开分析结果页时会同时请求十几个图表接口，每个接口都要单独访问一次数据库。
+    这个函数用一次带多字段投影的查询取回所有需要的字段，在一次响应中返回。
 
-        logger.info(f"成功查询到任务 {task_id} 的单组数据分析结果")
-        return ResultData(
-            code="200",
-            message="查询成功",
-            data=response.model_dump()
-        )
+    Args:
+        task_id: 任务ID
+        fields: 需要的图表字段列表，必须是 CHART_FIELDS 的键；为空时返回全部图表
 
-    except Exception as e:
-        logger.error(f"查询单组数据分析结果失败: {str(e)}\n{traceback.format_exc()}")
-        return ResultData.fail("500", f"查询单组数据分析结果失败: {str(e)}")
+    Returns:
+        ResultData: 查询结果，data 为 {字段名: {"task_id": ..., 字段名: 数据}}
 
-def query_factor_excess_chart(task_id: str, resample: str = 'W'):
-    """
-    查询因子超额收益图表数据
-    :param task_id: 任务ID
-    :return: 超额收益图表数据
+    Example:
+        >>> result = await query_all_charts("task_456", ["ic_decay_chart", "return_chart"])
     """
     try:
-        # 从数据库中查询结果
-        result = _db_handler.mongo_find_one(
-            "panda",
-            "factor_analysis_results",
-            {"task_id": task_id}
-        )
+        fields = list(dict.fromkeys(fields)) if fields else list(CHART_FIELDS)
+        invalid_fields = [f for f in fields if f not in CHART_FIELDS]
+        if invalid_fields:
+            return ResultData.fail("400", f"不支持的图表字段: {', '.join(invalid_fields)}")
 
-        if not result:
+        # 一次查询取回所有需要的字段（已缓存的字段不再查询）
+        result = await _fetch_chart_fields(task_id, fields)
+
+        if result is None:
             logger.warning(f"未找到任务 {task_id} 的分析结果")
             return ResultData.fail("404", f"未找到任务 {task_id} 的分析结果")
 
-        # 构造响应数据
-        response = FactorExcessChartResponse(
-            task_id=task_id,
-            excess_chart=result.get("excess_chart")
-        )
-
-        logger.info(f"成功查询到任务 {task_id} 的超额收益图表数据")
-        return ResultData.success(data=response.model_dump())
+        logger.info(f"成功查询到任务 {task_id} 的 {len(fields)} 个图表数据")
+        return _stream_success((f, _build_chart_data(task_id, f, result)) for f in fields)
 
     except Exception as e:
-        logger.error(f"查询超额收益图表失败: {str(e)}\n{traceback.format_exc()}")
-        return ResultData.fail("500", f"查询超额收益图表失败: {str(e)}")
+        logger.exception("批量查询图表数据失败")
+        return ResultData.fail("500", f"批量查询图表数据失败: {str(e)}")
 
 
-def query_factor_analysis_data(task_id: str):
-    """
-    查询因子分析数据
-    :param task_id: 任务ID
-    :return: 因子分析数据
-    """
-    try:
-        # 从数据库中查询结果
-        result = _db_handler.mongo_find_one(
-            "panda",
-            "factor_analysis_results",
-            {"task_id": task_id}
-        )
+async def query_group_return_analysis(task_id: str):
+    """查询分组收益分析数据"""
+    return await _query_chart(task_id, "group_return_analysis")
 
-        if not result:
-            logger.warning(f"未找到任务 {task_id} 的分析结果")
-            return ResultData.fail("404", f"未找到任务 {task_id} 的分析结果")
+async def query_ic_decay_chart(task_id: str):
+    """查询因子IC衰减图数据"""
+    return await _query_chart(task_id, "ic_decay_chart")
 
-        # 构造响应数据
-        response = FactorAnalysisDataResponse(
-            task_id=task_id,
-            factor_data_analysis=result.get("factor_data_analysis", [])
-        )
+async def query_ic_density_chart(task_id: str):
+    """查询因子IC分布图数据"""
+    return await _query_chart(task_id, "ic_den_chart")
 
-        logger.info(f"成功查询到任务 {task_id} 的因子分析数据")
-        return ResultData(
-            code="200",
-            message="查询成功",
-            data=response.model_dump()
-        )
+async def query_ic_self_correlation_chart(task_id: str):
+    """查询因子IC自相关图数据"""
+    return await _query_chart(task_id, "ic_self_correlation_chart")
 
-    except Exception as e:
-        logger.error(f"查询因子分析数据失败: {str(e)}\n{traceback.format_exc()}")
-        return ResultData.fail("500", f"查询因子分析数据失败: {str(e)}")
+async def query_ic_sequence_chart(task_id: str):
+    """查询因子IC序列图数据"""
+    return await _query_chart(task_id, "ic_seq_chart")
 
+async def query_rank_ic_decay_chart(task_id: str):
+    """查询因子Rank IC衰减图数据"""
+    return await _query_chart(task_id, "rank_ic_decay_chart")
 
-def query_return_chart(task_id: str):
-    """
-    查询因子收益率图表数据
-    :param task_id: 任务ID
-    :return: 收益率图表数据
-    """
-    try:
-        # 从数据库中查询结果
-        result = _db_handler.mongo_find_one(
-            "panda",
-            "factor_analysis_results",
-            {"task_id": task_id}
-        )
+async def query_rank_ic_density_chart(task_id: str):
+    """查询因子Rank IC分布图数据"""
+    return await _query_chart(task_id, "rank_ic_den_chart")
 
-        if not result:
-            logger.warning(f"未找到任务 {task_id} 的分析结果")
-            return ResultData.fail("404", f"未找到任务 {task_id} 的分析结果")
+async def query_rank_ic_self_correlation_chart(task_id: str):
+    """查询因子Rank IC自相关图数据"""
+    return await _query_chart(task_id, "rank_ic_self_correlation_chart")
 
-        # 构造响应数据
-        response = ReturnChartResponse(
-            task_id=task_id,
-            return_chart=result.get("return_chart")
-        )
+async def query_rank_ic_sequence_chart(task_id: str):
+    """查询因子Rank IC序列图数据"""
+    return await _query_chart(task_id, "rank_ic_seq_chart")
 
-        logger.info(f"成功查询到任务 {task_id} 的收益率图表数据")
-        return ResultData(
-            code="200",
-            message="查询成功",
-            data=response.model_dump()
-        )
+async def query_last_date_top_factor(task_id: str):
+    """查询最新日期的因子值数据"""
+    return await _query_chart(task_id, "last_date_top_factor")
 
-    except Exception as e:
-        logger.error(f"查询收益率图表数据失败: {str(e)}\n{traceback.format_exc()}")
-        return ResultData.fail("500", f"查询收益率图表数据失败: {str(e)}")
+async def query_one_group_data(task_id: str):
+    """查询单组数据分析结果"""
+    return await _query_chart(task_id, "one_group_data")
 
-def query_simple_return_chart(task_id: str):
-    """
-    查询因子单组收益率图表数据
-    :param task_id: 任务ID
-    :return: 单组收益率图表数据
-    """
-    try:
-        # 从数据库中查询结果
-        result = _db_handler.mongo_find_one(
-            "panda",
-            "factor_analysis_results",
-            {"task_id": task_id}
-        )
+async def query_factor_excess_chart(task_id: str, resample: str = 'W'):
+    """查询因子超额收益图表数据"""
+    return await _query_chart(task_id, "excess_chart")
 
-        if not result:
-            logger.warning(f"未找到任务 {task_id} 的分析结果")
-            return ResultData.fail("404", f"未找到任务 {task_id} 的分析结果")
+async def query_factor_analysis_data(task_id: str):
+    """查询因子分析数据"""
+    return await _query_chart(task_id, "factor_data_analysis")
 
-        # 构造响应数据
-        response = SimpleReturnChartResponse(
-            task_id=task_id,
-            simple_return_chart=result.get("simple_return_chart")
-        )
-
-        logger.info(f"成功查询到任务 {task_id} 的单组收益率图表数据")
-        return ResultData(
-            code="200",
-            message="查询成功",
-            data=response.model_dump()
-        )
+async def query_return_chart(task_id: str):
+    """查询因子收益率图表数据"""
+    return await _query_chart(task_id, "return_chart")
 
-    except Exception as e:
-        logger.error(f"查询单组收益率图表数据失败: {str(e)}\n{traceback.format_exc()}")
-        return ResultData.fail("500", f"查询单组收益率图表数据失败: {str(e)}")
-    
-    
\ No newline at end of file
+async def query_simple_return_chart(task_id: str):
+    """查询因子单组收益率图表数据"""
+    return await _query_chart(task_id, "simple_return_chart")
@@ -13,6 +13,7 @@ setup(
         'panda_data',
         'panda_factor',
         'pydantic',
+        'orjson',
         'tqsdk',
         'rqdatac',
         'tqdm',
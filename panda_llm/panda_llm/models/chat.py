@@ -32,6 +32,33 @@
 from pydantic import BaseModel, Field
 from typing import List, Optional
 from datetime import datetime
+import time
+
+# 时间戳缓存的粒度：1 秒内分为 10 个时间片，即 100 毫秒
+_TS_TICKS_PER_SECOND = 10
+
+# 当前时间片对应的 ISO 时间戳缓存：(时间片编号, ISO 字符串)
+_ts_cache = (0, "")
+
+
+def now_iso() -> str:
+    """返回 100 毫秒精度的当前 ISO 时间戳
+
+    为什么需要这个函数？
+    流式聊天中每轮会创建多条消息，datetime.now().isoformat() 需要处理时区和
+    字符串格式化，开销不小。同一个 100 毫秒时间片内的调用直接复用缓存的字符串，
+    只有进入新的时间片时才重新格式化一次。
+
+    输出固定包含微秒部分（如 2024-01-01T10:00:00.100000），字符串的字典序与时间顺序一致。
+    会话和消息的所有时间戳都应该通过这个函数生成，避免数据库中混入不同精度和格式的时间。
+    """
+    global _ts_cache
+    tick = time.time_ns() // (1_000_000_000 // _TS_TICKS_PER_SECOND)
+    cached_tick, cached_iso = _ts_cache
+    if tick != cached_tick:
+        cached_iso = datetime.fromtimestamp(tick / _TS_TICKS_PER_SECOND).isoformat(timespec="microseconds")
+        _ts_cache = (tick, cached_iso)
+    return cached_iso
 
 class Message(BaseModel):
     """消息模型
@@ -45,7 +72,7 @@ class Message(BaseModel):
     """
     role: str  # user 或 assistant
     content: str
-    timestamp: str = Field(default_factory=lambda: datetime.now().isoformat())
+    timestamp: str = Field(default_factory=now_iso)
 
 class ChatSession(BaseModel):
     """聊天会话模型
@@ -58,12 +85,16 @@ class ChatSession(BaseModel):
         messages: 消息列表，默认空列表
         created_at: 创建时间，默认当前时间
         updated_at: 更新时间，默认当前时间
+        summary: 滑动窗口之外的早期对话摘要，尚未生成时为 None
+        summary_pending: 上次生成摘要以来追加的消息数（包括仍在滑动窗口内的消息）
     """
     id: str
     user_id: str
     messages: List[Message] = Field(default_factory=list)
-    created_at: str = Field(default_factory=lambda: datetime.now().isoformat())
-    updated_at: str = Field(default_factory=lambda: datetime.now().isoformat())
+    created_at: str = Field(default_factory=now_iso)
+    updated_at: str = Field(default_factory=now_iso)
+    summary: Optional[str] = None
+    summary_pending: int = 0
 
     class Config:
         schema_extra = {
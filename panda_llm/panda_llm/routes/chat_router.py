@@ -38,16 +38,51 @@
 """
 
 from fastapi import APIRouter, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, ORJSONResponse
 from pydantic import BaseModel
 from typing import Optional
-import json
+import orjson
 
 from panda_llm.services.chat_service import ChatService
 
 router = APIRouter()
 chat_service = ChatService()
 
+# SSE 响应头：禁止缓存，并关闭 nginx 等反向代理的响应缓冲，保证每个片段立即送达浏览器
+_SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+}
+
+def _sse_event(payload: dict) -> bytes:
+    """把一个事件编码为 SSE 的 data 行
+
+    每个 token 都要编码一次，使用 orjson 直接生成 UTF-8 字节（中文不转义），
+    StreamingResponse 可以直接发送，不需要再编码一次字符串。
+    """
+    return b"data: " + orjson.dumps(payload) + b"\n\n"
+
+async def sse_stream(user_id: str, message: str, session_id: Optional[str] = None):
+    """把 process_message_stream 返回的回答片段包装为 SSE 事件流
+
+    每个片段输出一个 {"content": 片段} 事件，出错时输出 {"error": 错误信息} 事件，
+    最后总是以 data: [DONE] 结束。
+    """
+    try:
+        async for chunk in chat_service.process_message_stream(user_id, message, session_id):
+            yield _sse_event({"content": chunk})
+    except ValueError as e:
+        yield _sse_event({"error": str(e)})
+    except Exception:
+        yield _sse_event({"error": "处理消息时发生错误"})
+    finally:
+        yield b"data: [DONE]\n\n"
+
+@router.on_event("startup")
+async def create_indexes():
+    """服务启动时创建聊天会话的索引（引入本路由的应用都会执行）"""
+    await chat_service.mongodb.ensure_indexes()
+
 class ChatRequest(BaseModel):
     """聊天请求模型
 
@@ -97,25 +132,10 @@ async def chat(request: ChatRequest):
     """
     try:
         # 使用流式处理
-        async def generate():
-            try:
-                # async for chunk in chat_service.process_message_stream(
-                async for chunk in chat_service.process_message_stream(
-                    request.user_id,
-                    request.message,
-                    request.session_id
-                ):
-                    yield f"data: {json.dumps({'content': chunk})}\n\n"
-            except ValueError as e:
-                yield f"data: {json.dumps({'error': str(e)})}\n\n"
-            except Exception as e:
-                yield f"data: {json.dumps({'error': '处理消息时发生错误'})}\n\n"
-            finally:
-                yield "data: [DONE]\n\n"
-
         return StreamingResponse(
-            generate(),
-            media_type="text/event-stream"
+            sse_stream(request.user_id, request.message, request.session_id),
+            media_type="text/event-stream",
+            headers=_SSE_HEADERS
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -124,21 +144,22 @@ async def chat(request: ChatRequest):
 async def get_sessions(user_id: str, limit: int = 10):
     """获取用户的聊天会话列表
 
-    这个接口获取指定用户的所有聊天会话列表。
+    这个接口获取指定用户最近更新的聊天会话列表，按更新时间倒序排列。
+    列表中的会话不包含消息历史（messages 为空列表）。
 
     Args:
         user_id: 用户 ID
         limit: 返回的会话数量限制，默认 10
 
     Returns:
-        dict: 包含会话列表的字典
+        ORJSONResponse: 包含会话列表的响应，会话直接按 JSON 模式导出后由 orjson 序列化
 
     Example:
         >>> GET /llm/chat/sessions?user_id=user1&limit=10
     """
     try:
         sessions = await chat_service.get_user_sessions(user_id, limit)
-        return {"sessions": [session.dict() for session in sessions]}
+        return ORJSONResponse({"sessions": [session.model_dump(mode="json", exclude_none=True) for session in sessions]})
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
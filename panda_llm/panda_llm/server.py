@@ -36,10 +36,12 @@ Panda LLM API 服务器模块
 
 - CORS 配置允许所有来源访问（生产环境建议限制）
 - 路由前缀为 /llm，所有聊天接口都在此路径下
+- 默认响应类为 ORJSONResponse，需要安装 orjson
 """
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from panda_common.logger_config import logger
 
 
@@ -48,7 +50,8 @@ from panda_common.logger_config import logger
 app = FastAPI(
     title="Panda LLM API",
     description="基于 FastAPI 和 DeepSeek 的聊天 API 服务",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse  # 使用 orjson 序列化 JSON 响应
 )
 
 # 配置 CORS（跨域资源共享）
@@ -0,0 +1,109 @@
+"""
+LLM 回答缓存模块
+
+本模块提供了 LLM 回答的内存缓存，对相同的问题直接返回之前生成的回答，不再调用 LLM。
+
+核心概念
+--------
+
+- **精确匹配缓存**：以发送给 LLM 的全部消息作为键，内容完全相同（忽略首尾空白）才命中
+- **LRU 淘汰**：超出容量时淘汰最久未使用的回答
+- **温度限制**：只缓存低温度（输出稳定）的回答
+
+为什么需要这个模块？
+-------------------
+
+因子开发问答中，大量问题是重复的：
+- "如何计算动量因子？"
+- "RANK 函数怎么用？"
+
+每次调用 LLM 需要几百毫秒到几秒，而缓存命中只是一次字典查找。
+
+工作原理（简单理解）
+------------------
+
+就像常见问题解答（FAQ）：
+
+1. **规范化问题**：去掉首尾空白（就像整理问题的措辞）
+2. **查找缓存**：用发送给 LLM 的全部消息计算哈希，查找是否回答过（就像翻 FAQ）
+3. **写入缓存**：没有命中时调用 LLM，把回答记下来（就像补充 FAQ）
+
+注意事项
+--------
+
+- 缓存只保存在当前进程的内存中，服务重启后清空
+- 缓存由所有用户和会话共享，因此键必须覆盖发送给 LLM 的全部内容（动态上下文、对话摘要和滑动窗口中的
+  每条消息），只有模型看到的输入完全相同时才复用回答，不会把一个会话的回答返回给另一个会话
+- 温度高于 MAX_CACHEABLE_TEMPERATURE 的请求输出随机性大，不使用缓存
+"""
+
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Optional
+
+# 允许使用缓存的最高温度，温度越高同一问题的回答差异越大
+MAX_CACHEABLE_TEMPERATURE = 0.3
+
+
+def _normalize(content: str) -> str:
+    """规范化消息内容：只去掉首尾空白
+
+    问题中经常包含因子代码，大小写（RANK 与 rank）和 Python 缩进都会影响含义，
+    因此内容中间的字符保持原样，不做大小写和空白的合并。
+    """
+    return content.strip()
+
+
+def make_cache_key(messages, context_messages=None) -> str:
+    """根据发送给 LLM 的全部消息计算缓存键
+
+    固定的系统提示词对所有请求都相同，不参与计算；除此之外，键覆盖请求中的每一条消息，
+    与 LLMService._prepare_messages 组装的消息列表一一对应。
+
+    Args:
+        messages: 发送给 LLM 的对话消息列表，可以是 Message 对象或字典格式
+        context_messages: 动态上下文消息列表（可选，如对话摘要）
+
+    Returns:
+        str: blake2b 哈希值
+    """
+    normalized = [
+        (m["role"], _normalize(m["content"])) if isinstance(m, dict) else (m.role, _normalize(m.content))
+        for m in [*(context_messages or []), *messages]
+    ]
+    payload = json.dumps(normalized, ensure_ascii=False).encode("utf-8")
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+
+class ExactCache:
+    """精确匹配的 LLM 回答缓存（LRU）
+
+    缓存只在单个事件循环中使用，读写之间没有 await，因此不需要加锁。
+
+    Args:
+        maxsize: 最多缓存的回答条数
+
+    Example:
+        >>> cache = ExactCache(maxsize=10_000)
+        >>> key = make_cache_key(messages)
+        >>> cache.get(key) or cache.set(key, "回答")
+    """
+
+    def __init__(self, maxsize: int = 10_000):
+        self._maxsize = maxsize
+        self._data = OrderedDict()
+
+    def get(self, key: str) -> Optional[str]:
+        """读取缓存的回答，未命中时返回 None"""
+        value = self._data.get(key)
+        if value is not None:
+            self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: str):
+        """写入回答，超出容量时淘汰最久未使用的条目"""
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self._maxsize:
+            self._data.popitem(last=False)
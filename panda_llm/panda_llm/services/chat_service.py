@@ -41,14 +41,24 @@
 - 所有对话历史都会保存到数据库
 """
 
-from datetime import datetime
 from typing import List, Optional, AsyncGenerator
 from panda_common.logger_config import logger
 from panda_llm.services.mongodb import MongoDBService
 from panda_llm.models.chat import ChatSession, Message
-from panda_llm.services.llm_service import LLMService
+from panda_llm.services.llm_service import get_llm_service
+import asyncio
 import uuid
 
+# 每次请求发送给 LLM 的最近消息条数，更早的对话用摘要代替
+HISTORY_WINDOW = 12
+# 滑动窗口之外累计多少条新消息后重新生成一次摘要
+SUMMARY_INTERVAL = 12
+
+# 正在运行的后台任务，保存引用防止任务在完成前被垃圾回收
+_background_tasks = set()
+# 正在生成摘要的会话 ID，同一个会话同时只运行一个摘要任务
+_summarizing_sessions = set()
+
 
 class ChatService:
     """聊天服务
@@ -88,35 +98,103 @@ class ChatService:
         self.mongodb = MongoDBService()
         self.logger = logger
 
+    def _append_message(self, session_id: str, session: ChatSession, message: Message):
+        """向会话追加一条消息，同时更新内存中的会话和数据库
+
+        内存中的会话立即更新；返回写入数据库的协程，由调用方决定立即 await 还是放到后台执行。
+        """
+        session.messages.append(message)
+        session.summary_pending += 1
+        return self.mongodb.append_message(session_id, message)
+
+    def _build_prompt(self, session: ChatSession):
+        """构造发送给 LLM 的消息
+
+        只发送最近 HISTORY_WINDOW 条消息的原文；更早的对话如果已有摘要，
+        作为一条 system 消息放在固定系统提示词之后（通过 context_messages 传入，不影响前缀缓存）。
+
+        Returns:
+            tuple: (对话消息列表, 上下文消息列表或 None)
+        """
+        messages = [{"role": msg.role, "content": msg.content} for msg in session.messages[-HISTORY_WINDOW:]]
+        context_messages = None
+        if session.summary:
+            context_messages = [{"role": "system", "content": f"以下是本次对话早期内容的摘要：{session.summary}"}]
+        return messages, context_messages
+
+    def _schedule_summary(self, session_id: str, session: ChatSession):
+        """滑动窗口之外积累了足够多的新消息时，在后台重新生成对话摘要
+
+        摘要需要额外调用一次 LLM，放到后台执行，不延迟当前回答的返回。
+        数据库中的 summary_pending 要等摘要完成后才减少，期间的下一轮对话仍会满足触发条件；
+        因此已有摘要任务在运行的会话直接跳过，避免同一批消息被重复摘要、计数被重复扣减。
+        """
+        if session_id in _summarizing_sessions:
+            return
+        # 从未生成过摘要的会话，所有消息都尚未计入摘要
+        pending = session.summary_pending if session.summary is not None else len(session.messages)
+        if pending < HISTORY_WINDOW + SUMMARY_INTERVAL:
+            return
+        _summarizing_sessions.add(session_id)
+        task = asyncio.create_task(self._update_summary(session_id, session))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+        task.add_done_callback(lambda _: _summarizing_sessions.discard(session_id))
+
+    async def _update_summary(self, session_id: str, session: ChatSession):
+        """生成新的对话摘要并保存
+
+        已有摘要时，把上次摘要之后追加、且已经离开滑动窗口的消息合并进摘要。
+        第一次生成摘要时，内存中的会话只包含最近 CHAT_HISTORY_LIMIT 条消息，
+        这里重新读取完整历史，滑动窗口之外的全部消息都计入摘要，不丢失更早的对话。
+
+        摘要完成后，数据库中未计入摘要的消息数应等于读取时的 summary_pending 减去本次计入摘要的消息数；
+        用 $inc 调整差值，不覆盖摘要生成期间新追加的消息计数。
+        """
+        try:
+            if session.summary is None:
+                session = await self.mongodb.get_chat_session(session_id, history_limit=None)
+                if not session or len(session.messages) <= HISTORY_WINDOW:
+                    return
+                to_summarize = session.messages[:-HISTORY_WINDOW]
+                # 从未生成过摘要的会话，计数可能与消息数不一致（如创建会话时的第一条消息不计数），一并校正
+                pending_delta = HISTORY_WINDOW - session.summary_pending
+            else:
+                # 上次摘要之后追加、且已经离开滑动窗口的消息
+                to_summarize = session.messages[-session.summary_pending:-HISTORY_WINDOW]
+                pending_delta = -len(to_summarize)
+            summary = await get_llm_service().summarize(to_summarize, session.summary)
+            await self.mongodb.update_summary(session_id, session.summary, summary, pending_delta)
+        except Exception as e:
+            self.logger.error(f"更新会话摘要失败: {str(e)}")
+
     async def process_message(self, session_id: str, user_message: str, user_id: str) -> str:
         """处理用户消息并返回 AI 响应"""
         try:
             # 获取或创建会话
+            user_msg = Message(role="user", content=user_message)
             session = await self.mongodb.get_chat_session(session_id)
-            if not session:
-                # 创建新会话时生成唯一 ID
+            if session:
+                # 添加用户消息（只追加这一条消息，不重写整个会话）
+                await self._append_message(session_id, session, user_msg)
+            else:
+                # 创建新会话时生成唯一 ID，用户消息随会话一起写入
                 session = ChatSession(
                     id=str(uuid.uuid4()),
                     user_id=user_id,
-                    messages=[],
-                    created_at=datetime.now().isoformat(),
-                    updated_at=datetime.now().isoformat()
+                    messages=[user_msg]
                 )
-                await self.mongodb.create_chat_session(session)
-
-            # 添加用户消息
-            user_msg = Message(role="user", content=user_message)
-            session.messages.append(user_msg)
-            await self.mongodb.update_chat_session(session.id, session)
+                session_id = await self.mongodb.create_chat_session(session)
 
-            # 调用 AI 服务
-            llm = LLMService()
-            ai_response = await llm.chat_completion(session.messages)
+            # 调用 AI 服务（最近的消息原文 + 早期对话摘要）
+            llm = get_llm_service()
+            messages, context_messages = self._build_prompt(session)
+            ai_response = await llm.chat_completion(messages, context_messages)
 
             # 添加 AI 响应
             ai_msg = Message(role="assistant", content=ai_response)
-            session.messages.append(ai_msg)
-            await self.mongodb.update_chat_session(session.id, session)
+            await self._append_message(session_id, session, ai_msg)
+            self._schedule_summary(session_id, session)
 
             return ai_response
 
@@ -125,8 +203,8 @@ class ChatService:
             raise
 
     async def get_session_messages(self, session_id: str) -> List[Message]:
-        """获取会话消息历史"""
-        session = await self.mongodb.get_chat_session(session_id)
+        """获取会话的完整消息历史"""
+        session = await self.mongodb.get_chat_session(session_id, history_limit=None)
         return session.messages if session else []
 
     async def clear_session(self, session_id: str):
@@ -151,11 +229,11 @@ class ChatService:
         --------
 
         1. 创建用户消息
-        2. 获取或创建会话
-        3. 保存用户消息到会话
-        4. 调用 LLM 流式生成回答
+        2. 获取会话并在后台追加用户消息，或在后台创建包含用户消息的新会话
+        3. 准备发送给 LLM 的历史消息（最近 HISTORY_WINDOW 条原文 + 早期对话摘要）
+        4. 调用 LLM 流式生成回答（与第 2 步的数据库写入同时进行）
         5. 逐个返回回答片段
-        6. 保存完整回答到会话
+        6. 等待用户消息写入完成，保存完整回答到会话，必要时在后台更新对话摘要
 
         Args:
             user_id: 用户 ID
@@ -174,59 +252,71 @@ class ChatService:
             >>> async for chunk in service.process_message_stream("user1", "你好"):
             ...     print(chunk, end='')
         """
+        # 后台写入用户消息的任务，以及它是否已在正常流程中被等待
+        persist_user = None
+        persist_awaited = False
         try:
             # 创建用户消息
-            user_message = Message(
-                role="user",
-                content=message,
-                timestamp=datetime.now().isoformat()
-            )
+            user_message = Message(role="user", content=message)
 
             # 获取或创建会话
+            # 保存用户消息的数据库写入放到后台执行，与 LLM 请求同时进行，第一个片段不需要等待写入完成
             if session_id:
                 session = await self.mongodb.get_chat_session(session_id)
                 if not session:
                     logger.error(f"会话不存在: {session_id}")
                     raise ValueError(f"会话不存在: {session_id}")
+                # 追加用户消息（只写入这一条消息，不重写整个会话）
+                persist_user = asyncio.create_task(self._append_message(session_id, session, user_message))
             else:
+                # 新会话创建时已经包含用户消息，不需要再追加
                 session = ChatSession(
                     id=str(uuid.uuid4()),
                     user_id=user_id,
-                    messages=[user_message],
-                    created_at=datetime.now().isoformat(),
-                    updated_at=datetime.now().isoformat()
+                    messages=[user_message]
                 )
-                session_id = await self.mongodb.create_chat_session(session)
-                logger.info(f"创建新会话: {session_id}")
-
-            # 更新会话
-            session.messages.append(user_message)
-            await self.mongodb.update_chat_session(session.id, session)
+                persist_user = asyncio.create_task(self.mongodb.create_chat_session(session))
 
-            # 准备历史消息
-            messages = [{"role": msg.role, "content": msg.content} for msg in session.messages]
+            # 准备历史消息（最近的消息原文 + 早期对话摘要）
+            messages, context_messages = self._build_prompt(session)
 
             # 调用 AI 服务
-            llm = LLMService()
-            full_response = ""
-            async for chunk in llm.chat_completion_stream(messages):
-                full_response += chunk
+            llm = get_llm_service()
+            # 片段先放入列表，结束后一次拼接，避免每个 token 都创建一个新的字符串
+            parts = []
+            async for chunk in llm.chat_completion_stream(messages, context_messages):
+                parts.append(chunk)
                 yield chunk
+            full_response = "".join(parts)
 
-            # 添加 AI 响应
+            # 等待用户消息写入完成后再追加 AI 响应，保证消息顺序；新会话在这里拿到数据库生成的 ID
+            persist_awaited = True
+            new_session_id = await persist_user
+            if not session_id:
+                session_id = new_session_id
+                logger.info(f"创建新会话: {session_id}")
+
+            # 追加 AI 响应
             ai_msg = Message(role="assistant", content=full_response)
-            session.messages.append(ai_msg)
-            await self.mongodb.update_chat_session(session.id, session)
+            await self._append_message(session_id, session, ai_msg)
+            self._schedule_summary(session_id, session)
 
         except Exception as e:
             self.logger.error(f"处理消息失败: {str(e)}")
             raise
+        finally:
+            # LLM 流式输出出错或客户端断开时，上面没有等待写入任务：
+            # 这里仍然等待用户消息写入完成，并取回写入失败的异常，避免出现 "Task exception was never retrieved"
+            if persist_user is not None and not persist_awaited:
+                try:
+                    await persist_user
+                except Exception:
+                    self.logger.exception("保存用户消息失败")
 
     async def get_user_sessions(self, user_id: str, limit: int = 10) -> List[ChatSession]:
         """获取用户的聊天会话列表"""
         try:
-            sessions = await self.mongodb.get_user_sessions(user_id)
-            return sessions[:limit]
+            return await self.mongodb.get_user_sessions(user_id, limit)
         except Exception as e:
             self.logger.error(f"获取用户会话列表失败: {str(e)}")
             raise 
\ No newline at end of file
@@ -41,105 +41,45 @@
 - 支持流式和非流式两种响应模式
 """
 
+import httpx
 import openai
 from panda_common.logger_config import logger
 from panda_common.config import get_config
-import traceback
+from panda_llm.services.cache import ExactCache, make_cache_key, MAX_CACHEABLE_TEMPERATURE
 import json
+from functools import lru_cache
+from types import MappingProxyType
 from typing import Optional, Dict, List, Any, Union
 
-class LLMService:
-    """大语言模型服务
-
-    这个类封装了与大语言模型的交互逻辑，提供了聊天完成和流式响应功能。
-    它专门针对因子开发场景，配置了系统提示词，限制模型只能回答因子开发相关的问题。
-
-    为什么需要这个类？
-    -----------------
-
-    在因子开发过程中，需要智能助手帮助：
-    - 编写和优化因子代码
-    - 解释内置函数的使用方法
-    - 调试因子代码
-    - 提供因子开发建议
-
-    这个类提供了与 LLM 交互的统一接口。
-
-    工作原理（简单理解）
-    ------------------
-
-    就像与 AI 助手对话：
-
-    1. **初始化连接**：创建 LLM 客户端连接（就像连接 AI 助手）
-    2. **配置角色**：设置系统提示词，定义助手角色（就像告诉助手它的职责）
-    3. **发送消息**：将用户消息和历史对话发送给 LLM（就像提问）
-    4. **接收回答**：接收 LLM 生成的回答（就像收到回答）
-
-    实际使用场景
-    -----------
-
-    发送聊天消息并获取回答：
-
-    ```python
-    llm = LLMService()
-    messages = [Message(role="user", content="如何计算动量因子？")]
-    response = await llm.chat_completion(messages)
-    ```
-
-    注意事项
-    --------
-
-    - 使用 OpenAI 兼容的 API，支持 DeepSeek 等模型
-    - 系统提示词限制模型只能回答因子开发相关问题
-    - 所有回答都使用中文
-    - 支持流式和非流式两种响应模式
-    """
-    def __init__(self):
-        """初始化 LLM 服务
-
-        这个函数就像"启动 AI 助手"，它会：
-        - 从配置中读取 API 密钥、模型和基础 URL
-        - 创建 OpenAI 客户端连接
-        - 配置系统提示词，定义助手角色
-
-        为什么需要系统提示词？
-        --------------------
-
-        系统提示词定义了 AI 助手的角色和行为：
-        - 限制助手只能回答因子开发相关问题
-        - 确保所有回答都使用中文
-        - 提供因子开发的知识和示例
-
-        工作原理
-        --------
-
-        1. **读取配置**：从配置中读取 LLM 相关配置
-        2. **创建客户端**：创建 OpenAI 兼容的客户端
-        3. **配置提示词**：设置系统提示词，定义助手角色
-
-        Raises:
-            Exception: 如果配置缺失或客户端创建失败，会抛出异常
-
-        Example:
-            >>> llm = LLMService()
-        """
-        # 从配置中读取 LLM 相关配置
-        config = get_config()
-        self.api_key = config.get("LLM_API_KEY")  # API 密钥
-        self.model = config.get("LLM_MODEL")  # 模型名称
-        self.base_url = config.get("LLM_BASE_URL")  # API 基础 URL
-        
-        # 创建 OpenAI 兼容的客户端（支持 DeepSeek 等模型）
-        self.client = openai.OpenAI(
-            api_key=self.api_key,
-            base_url=self.base_url
-        )
-        
-        # 定义系统提示词，限制模型只能作为因子开发助手
-        # 这个提示词定义了助手的角色、能力和行为规范
-        self.system_message = {
-            "role": "system",
-            "content": """You are PandaAI Factor Development Assistant, a specialized AI designed to help with quantitative factor development and optimization.
+# 所有 LLMService 实例共享的 HTTP 客户端
+# 开启 HTTP/2 后多个并发请求可以复用同一个 TCP 连接；保持长连接，避免每轮对话都重新进行 TLS 握手
+_HTTP_CLIENT = httpx.AsyncClient(
+    http2=True,
+    limits=httpx.Limits(max_connections=200, max_keepalive_connections=100, keepalive_expiry=60),
+    timeout=httpx.Timeout(60.0, connect=5.0)
+)
+
+# 非流式和流式请求使用的温度
+_COMPLETION_TEMPERATURE = 0.7
+_STREAM_TEMPERATURE = 0.1
+
+# 生成对话摘要时使用的系统提示词
+_SUMMARY_PROMPT = (
+    "请用中文简要总结以下对话中与因子开发相关的要点，包括用户的需求、已经给出的结论和代码要点，"
+    "不超过 300 字。如果提供了之前的摘要，请把新的对话内容合并进去，输出一份完整的新摘要。"
+)
+
+# 系统提示词，限制模型只能作为因子开发助手
+# 这个提示词定义了助手的角色、能力和行为规范。它是一个约 4 KB 的固定字符串，
+# 在模块导入时创建一次，所有请求共享，不再在每次创建 LLMService 时重新构造。
+#
+# 注意：系统提示词必须保持完全固定。LLM 服务商会缓存请求中最长的固定前缀，
+# 只要系统提示词不变，后续请求都能命中缓存，显著降低首字延迟和输入 token 费用。
+# 用户相关的动态内容（记忆、上下文等）不要拼接到这里，应通过 _prepare_messages 的
+# context_messages 参数放在系统提示词之后。这里用 MappingProxyType 冻结，防止被意外修改
+_SYSTEM_MESSAGE = MappingProxyType({
+    "role": "system",
+    "content": """You are PandaAI Factor Development Assistant, a specialized AI designed to help with quantitative factor development and optimization.
 
 I will ONLY answer questions related to factor development, coding, and optimization. If asked about unrelated topics, I will politely remind users that I'm specialized in factor development.
 
@@ -246,14 +186,111 @@ class ComplexFactor(Factor):
 IMPORTANT: I will not reference functions that don't exist in the system. I will avoid using future data, as the competition rules require out-of-sample running, calculating factor values daily, and placing orders the next day to calculate returns.
 
 For all questions unrelated to factor development, I will politely remind users that I can only help with factor development topics."""
-        }
+})
+
+
+class LLMService:
+    """大语言模型服务
+
+    这个类封装了与大语言模型的交互逻辑，提供了聊天完成和流式响应功能。
+    它专门针对因子开发场景，配置了系统提示词，限制模型只能回答因子开发相关的问题。
+
+    为什么需要这个类？
+    -----------------
+
+    在因子开发过程中，需要智能助手帮助：
+    - 编写和优化因子代码
+    - 解释内置函数的使用方法
+    - 调试因子代码
+    - 提供因子开发建议
 
-    def _prepare_messages(self, messages):
+    这个类提供了与 LLM 交互的统一接口。
+
+    工作原理（简单理解）
+    ------------------
+
+    就像与 AI 助手对话：
+
+    1. **初始化连接**：创建 LLM 客户端连接（就像连接 AI 助手）
+    2. **配置角色**：设置系统提示词，定义助手角色（就像告诉助手它的职责）
+    3. **发送消息**：将用户消息和历史对话发送给 LLM（就像提问）
+    4. **接收回答**：接收 LLM 生成的回答（就像收到回答）
+
+    实际使用场景
+    -----------
+
+    发送聊天消息并获取回答：
+
+    ```python
+    llm = LLMService()
+    messages = [Message(role="user", content="如何计算动量因子？")]
+    response = await llm.chat_completion(messages)
+    ```
+
+    注意事项
+    --------
+
+    - 使用 OpenAI 兼容的 API，支持 DeepSeek 等模型
+    - 系统提示词限制模型只能回答因子开发相关问题
+    - 所有回答都使用中文
+    - 支持流式和非流式两种响应模式
+    """
+    def __init__(self):
+        """初始化 LLM 服务
+
+        这个函数就像"启动 AI 助手"，它会：
+        - 从配置中读取 API 密钥、模型和基础 URL
+        - 创建 OpenAI 客户端连接
+        - 配置系统提示词，定义助手角色
+
+        为什么需要系统提示词？
+        --------------------
+
+        系统提示词定义了 AI 助手的角色和行为：
+        - 限制助手只能回答因子开发相关问题
+        - 确保所有回答都使用中文
+        - 提供因子开发的知识和示例
+
+        工作原理
+        --------
+
+        1. **读取配置**：从配置中读取 LLM 相关配置
+        2. **创建客户端**：创建 OpenAI 兼容的客户端
+        3. **配置提示词**：设置系统提示词，定义助手角色
+
+        Raises:
+            Exception: 如果配置缺失或客户端创建失败，会抛出异常
+
+        Example:
+            >>> llm = LLMService()
+        """
+        # 从配置中读取 LLM 相关配置
+        config = get_config()
+        self.api_key = config.get("LLM_API_KEY")  # API 密钥
+        self.model = config.get("LLM_MODEL")  # 模型名称
+        self.base_url = config.get("LLM_BASE_URL")  # API 基础 URL
+        
+        # 创建 OpenAI 兼容的异步客户端（支持 DeepSeek 等模型）
+        # 使用异步客户端，等待 LLM 返回期间不会阻塞事件循环，其他聊天请求可以并发处理
+        self.client = openai.AsyncOpenAI(
+            api_key=self.api_key,
+            base_url=self.base_url,
+            http_client=_HTTP_CLIENT
+        )
+
+        # 回答缓存：相同的问题直接返回之前的回答，不再调用 LLM
+        self.cache = ExactCache(maxsize=10_000)
+
+    def _prepare_messages(self, messages, context_messages=None):
         """转换消息格式以适配 OpenAI API
 
         这个函数将内部消息格式转换为 OpenAI API 需要的格式。
         它会添加系统提示词，并转换消息对象为字典格式。
 
+        消息的排列顺序固定为：[系统提示词, *动态上下文消息, *对话消息]。
+        系统提示词始终是完全相同的第一条消息，可以被 LLM 服务商的前缀缓存命中；
+        动态内容只能通过 context_messages 放在它之后，不能修改系统提示词本身。
+
         为什么需要这个函数？
         --------------------
 
@@ -264,38 +301,25 @@ For all questions unrelated to factor development, I will politely remind users
         这个函数提供了格式转换的功能。
 
         Args:
-            messages: 消息列表，可以是 Message 对象或字典格式
+            messages: 消息列表，可以是 Message 对象或字典格式（字典需包含 role 和 content）
+            context_messages: 动态上下文消息列表（可选），格式同 messages，放在系统提示词之后
 
         Returns:
-            list: 格式化后的消息列表，包含系统提示词和用户消息
+            list: 格式化后的消息列表，包含系统提示词、上下文消息和用户消息
 
         Example:
             >>> messages = [Message(role="user", content="你好")]
             >>> formatted = llm._prepare_messages(messages)
         """
-        formatted_messages = []
-        
-        # 添加系统提示词
-        formatted_messages.append(self.system_message)
-        
-        # 添加用户消息
-        for msg in messages:
-            if hasattr(msg, 'role') and hasattr(msg, 'content'):
-                # 处理 Message 对象
-                formatted_messages.append({
-                    "role": msg.role,
-                    "content": msg.content
-                })
-            elif isinstance(msg, dict) and 'role' in msg and 'content' in msg:
-                # 处理已经是字典格式的消息
-                formatted_messages.append({
-                    "role": msg["role"],
-                    "content": msg["content"]
-                })
-        
-        return formatted_messages
-
-    async def chat_completion(self, messages) -> str:
+        # 系统提示词直接放入导入时创建的 _SYSTEM_MESSAGE，所有请求共享同一个只读对象，不逐次复制；
+        # OpenAI SDK 发送请求前会把每条消息参数转换成新的字典，不会修改也不要求传入可变字典。
+        # 已经是字典的消息直接使用，Message 对象转换为字典
+        return [_SYSTEM_MESSAGE] + [
+            msg if msg.__class__ is dict else {"role": msg.role, "content": msg.content}
+            for msg in [*(context_messages or []), *messages]
+        ]
+
+    async def chat_completion(self, messages, context_messages=None) -> str:
         """发送聊天请求到 OpenAI API（非流式）
 
         这个函数发送聊天请求到 LLM，并等待完整回答返回。
@@ -313,6 +337,7 @@ For all questions unrelated to factor development, I will politely remind users
 
         Args:
             messages: 消息列表，包含对话历史
+            context_messages: 动态上下文消息列表（可选），放在系统提示词之后
 
         Returns:
             str: LLM 生成的完整回答
@@ -325,24 +350,34 @@ For all questions unrelated to factor development, I will politely remind users
             >>> response = await llm.chat_completion(messages)
         """
         try:
+            # 低温度的请求先查缓存，命中时不再调用 LLM
+            cache_key = None
+            if _COMPLETION_TEMPERATURE <= MAX_CACHEABLE_TEMPERATURE:
+                cache_key = make_cache_key(messages, context_messages)
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    return cached
+
             # 格式化消息
-            formatted_messages = self._prepare_messages(messages)
+            formatted_messages = self._prepare_messages(messages, context_messages)
             
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model=self.model,
                 messages=formatted_messages,
-                temperature=0.7,
+                temperature=_COMPLETION_TEMPERATURE,
                 max_tokens=2000,
                 stream=False
             )
             content = response.choices[0].message.content
-            return content if content is not None else ""
-        except Exception as e:
-            traceback.print_exc()
-            logger.error(f"调用 OpenAI API 失败: {str(e)}")
+            content = content if content is not None else ""
+            if cache_key is not None and content:
+                self.cache.set(cache_key, content)
+            return content
+        except Exception:
+            logger.exception("调用 OpenAI API 失败")
             raise
 
-    async def chat_completion_stream(self, messages):
+    async def chat_completion_stream(self, messages, context_messages=None):
         """发送流式聊天请求到 OpenAI API
 
         这个函数发送聊天请求到 LLM，并以流式方式返回回答。
@@ -360,6 +395,7 @@ For all questions unrelated to factor development, I will politely remind users
 
         Args:
             messages: 消息列表，包含对话历史
+            context_messages: 动态上下文消息列表（可选），放在系统提示词之后
 
         Yields:
             str: LLM 生成的回答片段（逐个 token）
@@ -373,22 +409,88 @@ For all questions unrelated to factor development, I will politely remind users
             ...     print(chunk, end='')
         """
         try:
+            # 低温度的请求先查缓存，命中时把缓存的完整回答作为一个片段返回
+            cache_key = None
+            if _STREAM_TEMPERATURE <= MAX_CACHEABLE_TEMPERATURE:
+                cache_key = make_cache_key(messages, context_messages)
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    yield cached
+                    return
+
             # 格式化消息
-            formatted_messages = self._prepare_messages(messages)
+            formatted_messages = self._prepare_messages(messages, context_messages)
             
-            stream = self.client.chat.completions.create(
+            stream = await self.client.chat.completions.create(
                 model=self.model,
                 messages=formatted_messages,
-                temperature=0.1,
+                temperature=_STREAM_TEMPERATURE,
                 max_tokens=2000,
                 stream=True
             )
             
-            for chunk in stream:
+            parts = []
+            async for chunk in stream:
                 content = chunk.choices[0].delta.content
                 if content:
+                    parts.append(content)
                     yield content
-        except Exception as e:
-            traceback.print_exc()
-            logger.error(f"调用 OpenAI API 流式请求失败: {str(e)}")
-            raise 
\ No newline at end of file
+
+            # 完整生成后才写入缓存，中途出错或被取消的回答不缓存
+            if cache_key is not None and parts:
+                self.cache.set(cache_key, "".join(parts))
+        except Exception:
+            logger.exception("调用 OpenAI API 流式请求失败")
+            raise 
+
+
+    async def summarize(self, messages, previous_summary: Optional[str] = None) -> str:
+        """把早期的对话压缩成一段摘要
+
+        长对话只把最近几轮原文发给 LLM，更早的内容用这段摘要代替，
+        请求的输入 token 数不再随对话轮数无限增长。摘要使用独立的简短提示词，不使用因子助手的系统提示词。
+
+        Args:
+            messages: 需要合并进摘要的消息列表，可以是 Message 对象或字典格式
+            previous_summary: 之前的摘要（可选）
+
+        Returns:
+            str: 新的摘要
+        """
+        lines = []
+        if previous_summary:
+            lines.append(f"之前的摘要：{previous_summary}")
+        lines.extend(
+            f"{msg['role']}: {msg['content']}" if msg.__class__ is dict else f"{msg.role}: {msg.content}"
+            for msg in messages
+        )
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": _SUMMARY_PROMPT},
+                {"role": "user", "content": "\n".join(lines)}
+            ],
+            temperature=0.1,
+            max_tokens=500,
+            stream=False
+        )
+        content = response.choices[0].message.content
+        return content if content is not None else (previous_summary or "")
+
+
+@lru_cache(maxsize=1)
+def get_llm_service() -> LLMService:
+    """获取共享的 LLMService 实例
+
+    LLMService 在创建时会读取配置并创建 OpenAI 客户端（内部包含 HTTP 连接池）。
+    如果每轮对话都创建新实例，每次请求都要重新建立 TCP/TLS 连接。
+    这里在第一次调用时创建实例，之后所有请求复用同一个实例和连接池。
+
+    Returns:
+        LLMService: 共享的 LLM 服务实例
+
+    Example:
+        >>> llm = get_llm_service()
+        >>> response = await llm.chat_completion(messages)
+    """
+    return LLMService()
@@ -33,8 +33,8 @@ MongoDB 数据服务模块
 注意事项
 --------
 
-- 支持 ObjectId 和字符串两种 session_id 格式
-- 所有操作都是异步的
+- 支持 ObjectId 和字符串两种 session_id 格式（按格式判断，不依赖异常）
+- 所有操作都是异步的，通过 PyMongo 原生异步客户端访问数据库，不会阻塞事件循环
 - 错误会记录日志并抛出异常
 """
 
@@ -42,7 +42,24 @@ from panda_common.handlers.database_handler import DatabaseHandler
 from panda_common.config import config
 from panda_common.logger_config import logger
 from panda_llm.models.chat import *
+from panda_llm.models.chat import now_iso
 from bson import ObjectId
+import re
+
+# 获取会话时默认只取回最近的消息条数，避免很长的对话每轮都读取全部历史
+CHAT_HISTORY_LIMIT = 50
+
+# 24 位十六进制字符串才是合法的 ObjectId，使用 fullmatch 匹配整个字符串（"$" 会放过末尾的换行符）
+_OID_RE = re.compile(r"[0-9a-fA-F]{24}")
+
+
+def _session_query(session_id: str) -> dict:
+    """根据 session_id 构造查询条件
+
+    session_id 可能是 ObjectId 字符串，也可能是 UUID 等普通字符串。
+    先用正则判断格式，只有合法的 ObjectId 才转换，避免对普通字符串构造 ObjectId 时抛出异常。
+    """
+    return {"_id": ObjectId(session_id) if session_id and _OID_RE.fullmatch(session_id) else session_id}
 
 
 class MongoDBService:
@@ -81,29 +98,51 @@ class MongoDBService:
     """
     def __init__(self):
         self.db_handler = DatabaseHandler(config)
-        self.collection = self.db_handler.get_mongo_collection("panda","chat_sessions")
         self.logger = logger
 
+    @property
+    def collection(self):
+        """chat_sessions 的异步集合对象
+
+        使用 PyMongo 原生的异步客户端，等待数据库返回期间不会阻塞事件循环。
+        异步客户端在第一次访问时才创建，因此这里不在 __init__ 中获取集合。
+        """
+        return self.db_handler.get_async_mongo_collection("panda", "chat_sessions")
+
+    async def ensure_indexes(self):
+        """创建会话查询依赖的索引
+
+        会话列表按 user_id 筛选、按 updated_at 倒序排列，(user_id, updated_at) 复合索引
+        可以让查询直接按索引顺序取前 limit 个会话，不需要扫描和内存排序。
+        create_index 是幂等的，索引已存在时不会重复创建。
+        """
+        try:
+            await self.collection.create_index([("user_id", 1), ("updated_at", -1)])
+        except Exception as e:
+            # 索引创建失败（如权限不足）不影响服务启动，只是查询会变慢
+            self.logger.warning(f"创建会话索引失败: {str(e)}")
+
     async def create_chat_session(self, session: ChatSession) -> str:
         """创建新的聊天会话"""
         try:
-            result = self.collection.insert_one(session.dict())
+            result = await self.collection.insert_one(session.model_dump())
             return str(result.inserted_id)
         except Exception as e:
             self.logger.error(f"创建会话失败: {str(e)}")
             raise
 
-    async def get_chat_session(self, session_id: str) -> Optional[ChatSession]:
-        """获取聊天会话"""
+    async def get_chat_session(self, session_id: str, history_limit: Optional[int] = CHAT_HISTORY_LIMIT) -> Optional[ChatSession]:
+        """获取聊天会话
+
+        默认通过 $slice 投影只取回最近 history_limit 条消息，数据库传输的数据量和
+        Pydantic 校验的开销都不再随对话长度增长。需要完整历史时传入 history_limit=None。
+
+        截断后的会话不能整体写回数据库，追加消息请使用 append_message。
+        """
         try:
-            # 尝试将 session_id 转换为 ObjectId
-            try:
-                query = {"_id": ObjectId(session_id)}
-            except:
-                # 如果不是有效的 ObjectId，则使用原始字符串
-                query = {"_id": session_id}
-                
-            session = self.collection.find_one(query)
+            query = _session_query(session_id)
+            projection = {"messages": {"$slice": -history_limit}} if history_limit else None
+            session = await self.collection.find_one(query, projection)
             if session:
                 return ChatSession(**session)
             return None
@@ -111,43 +150,68 @@ class MongoDBService:
             self.logger.error(f"获取会话失败: {str(e)}")
             raise
 
-    async def update_chat_session(self, session_id: str, session: ChatSession):
-        """更新聊天会话"""
+    async def append_message(self, session_id: str, message: Message):
+        """向会话追加一条消息
+
+        只用 $push 把新消息追加到 messages 数组末尾，并更新 updated_at，
+        不再把整个会话（包括全部历史消息）重新写回数据库，每轮对话写入的数据量不随历史增长。
+        """
+        try:
+            query = _session_query(session_id)
+            await self.collection.update_one(
+                query,
+                {
+                    "$push": {"messages": message.model_dump()},
+                    "$set": {"updated_at": now_iso()},
+                    "$inc": {"summary_pending": 1}
+                }
+            )
+        except Exception as e:
+            self.logger.error(f"追加消息失败: {str(e)}")
+            raise
+
+    async def update_summary(self, session_id: str, previous_summary: Optional[str], summary: str, pending_delta: int):
+        """保存会话的对话摘要，并把尚未计入摘要的消息数调整 pending_delta
+
+        摘要在后台生成，期间 append_message 可能继续累加 summary_pending。
+        这里用 $inc 只减去本次实际计入摘要的消息数，不覆盖期间新增的计数。
+
+        只有数据库中的摘要仍是 previous_summary 时才写入：如果其他进程已经基于同一份摘要
+        完成了更新，本次结果直接丢弃，同一批消息的计数不会被扣减两次。
+
+        Returns:
+            bool: 是否写入了新的摘要
+        """
         try:
-            # 尝试将 session_id 转换为 ObjectId
-            try:
-                query = {"_id": ObjectId(session_id)}
-            except:
-                # 如果不是有效的 ObjectId，则使用原始字符串
-                query = {"_id": session_id}
-                
-            self.collection.update_one(
+            query = _session_query(session_id)
+            query["summary"] = previous_summary
+            result = await self.collection.update_one(
                 query,
-                {"$set": session.dict()}
+                {"$set": {"summary": summary}, "$inc": {"summary_pending": pending_delta}}
             )
+            return result.modified_count > 0
         except Exception as e:
-            self.logger.error(f"更新会话失败: {str(e)}")
+            self.logger.error(f"更新会话摘要失败: {str(e)}")
             raise
 
     async def delete_chat_session(self, session_id: str):
         """删除聊天会话"""
         try:
-            # 尝试将 session_id 转换为 ObjectId
-            try:
-                query = {"_id": ObjectId(session_id)}
-            except:
-                # 如果不是有效的 ObjectId，则使用原始字符串
-                query = {"_id": session_id}
-                
-            self.collection.delete_one(query)
+            query = _session_query(session_id)
+            await self.collection.delete_one(query)
         except Exception as e:
             self.logger.error(f"删除会话失败: {str(e)}")
             raise
 
-    async def get_user_sessions(self, user_id: str) -> List[ChatSession]:
-        """获取用户的所有会话"""
+    async def get_user_sessions(self, user_id: str, limit: int = 10) -> List[ChatSession]:
+        """获取用户最近更新的 limit 个会话
+
+        会话列表只需要会话的基本信息，因此不取回 messages 字段，返回的会话 messages 为空列表。
+        """
         try:
-            sessions = list(self.collection.find({"user_id": user_id}))
+            # 由数据库排序和截取数量，不再取回用户的全部会话及其完整的消息历史
+            cursor = self.collection.find({"user_id": user_id}, projection={"messages": 0})
+            sessions = await cursor.sort("updated_at", -1).limit(limit).to_list(length=limit)
             return [ChatSession(**session) for session in sessions]
         except Exception as e:
             self.logger.error(f"获取用户会话失败: {str(e)}")
@@ -61,6 +61,8 @@ setup(
         'pyyaml>=6.0.1',
         'python-dotenv>=1.0.0',
         'openai>=1.0.0',
+        'httpx[http2]>=0.24.0',
+        'orjson>=3.9.0',
         'panda_common',
     ],
     extras_require={
@@ -39,20 +39,97 @@ Panda Web 前端服务模块
 """
 
 import os
+import mimetypes
 import uvicorn
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, ORJSONResponse
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+
+
+def _accepted_encodings(accept_encoding: str) -> set:
+    """解析 Accept-Encoding 请求头，返回客户端接受的编码集合（q=0 表示明确拒绝，不计入）"""
+    accepted = set()
+    for token in accept_encoding.split(","):
+        name, _, params = token.partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            accepted.add(name)
+    return accepted
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """优先返回预压缩文件的静态文件服务
+
+    前端构建产物（JS、CSS）体积较大，如果构建时在同目录下生成了 .br / .gz 压缩版本，
+    当浏览器的 Accept-Encoding 支持时直接返回压缩文件，传输字节数减少数倍，
+    且请求时不需要消耗 CPU 压缩。没有压缩版本时返回原文件。
+
+    同时设置缓存头：assets 目录下的文件名带有内容哈希，内容变化时文件名也会变化，
+    可以让浏览器长期缓存；index.html 等入口文件每次都需要重新验证。
+
+    注意：不要在这个挂载点外层再加 GZipMiddleware，较旧版本的 Starlette 不会跳过
+    已经带有 Content-Encoding 的响应，会把 .br / .gz 文件再压缩一次并覆盖响应头。
+    """
+
+    # 按优先级排列的 (Content-Encoding, 文件后缀)
+    ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+    async def get_response(self, path: str, scope):
+        accepted = _accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        response = None
+        # 只对有扩展名的文件尝试压缩版本，目录和 html 回退路径交给 StaticFiles 处理
+        if os.path.splitext(path)[1]:
+            for encoding, suffix in self.ENCODINGS:
+                if encoding not in accepted:
+                    continue
+                try:
+                    response = await super().get_response(path + suffix, scope)
+                except HTTPException:
+                    continue
+                if response.status_code in (200, 304):
+                    response.headers["Content-Encoding"] = encoding
+                    response.headers["Content-Type"] = mimetypes.guess_type(path)[0] or "application/octet-stream"
+                    break
+                response = None
+        if response is None:
+            response = await super().get_response(path, scope)
+
+        # 同一个 URL 会根据 Accept-Encoding 返回不同内容，缓存需要区分
+        response.headers["Vary"] = "Accept-Encoding"
+        # StaticFiles 传入的 path 使用操作系统的路径分隔符（Windows 上是反斜杠），统一成 "/" 再判断
+        if path.replace(os.sep, "/").startswith("assets/"):
+            response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        else:
+            response.headers["Cache-Control"] = "no-cache"
+        return response
+
 
 # 创建 FastAPI 应用，用于托管前端静态文件
-app = FastAPI(title="PandaAI Web Interface")
+# 默认使用 ORJSONResponse，JSON 响应由 orjson 序列化
+app = FastAPI(title="PandaAI Web Interface", default_response_class=ORJSONResponse)
 
 # Configure CORS
+# 允许的来源从环境变量 ALLOWED_ORIGINS 读取（逗号分隔，如 "https://a.com,https://b.com"）。
+# 配置了具体来源时只需做集合查找，并允许携带凭证；
+# 未配置时允许任意来源，但不允许携带凭证（规范不允许通配符来源与凭证同时使用）
+ALLOWED_ORIGINS = [o.strip() for o in os.environ.get("ALLOWED_ORIGINS", "").split(",") if o.strip()]
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # In production, replace with specific origins
-    allow_credentials=True,
+    allow_origins=ALLOWED_ORIGINS or ["*"],
+    allow_credentials=bool(ALLOWED_ORIGINS),
     allow_methods=["*"],
     allow_headers=["*"],
 )
@@ -61,7 +138,7 @@ app.add_middleware(
 DIST_DIR = os.path.join(os.path.dirname(__file__), "static")
 
 # Mount the Vue dist directory at /factor path
-app.mount("/factor", StaticFiles(directory=DIST_DIR, html=True), name="static")
+app.mount("/factor", PrecompressedStaticFiles(directory=DIST_DIR, html=True), name="static")
 
 # Redirect root to /factor
 @app.get("/")
@@ -40,6 +40,7 @@ setup(
         "uvicorn>=0.15.0",
         "python-multipart>=0.0.5",
         "aiofiles>=0.7.0",
+        "orjson>=3.9.0",
         "panda_common"
     ],
     entry_points={